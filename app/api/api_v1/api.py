@@ -1,7 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from app.api.api_v1.endpoints import (
     addresses,
+    internal,
     locations,
     organizations,
     requirements,
@@ -10,6 +11,7 @@ from app.api.api_v1.endpoints import (
     vaccine_locations,
     webPush,
 )
+from app.api.dependencies import get_api_key
 
 api_router = APIRouter()
 
@@ -60,3 +62,11 @@ api_router.include_router(
     prefix="/webPush",
     tags=["WebPush"],
 )
+
+api_router.include_router(
+    internal.router,
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(get_api_key)],
+    include_in_schema=False,
+)
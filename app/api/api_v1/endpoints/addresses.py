@@ -1,9 +1,16 @@
-from typing import List
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_db,
+    get_stream_media_type,
+)
+from app.api.pagination import Pagination
+from app.api.responses import stream_response
 from app.db.database import MSSQLConnection
 from app.schemas.addresses import (
     AddressCreateRequest,
@@ -14,6 +21,7 @@ from app.services.addresses import AddressService
 from app.services.exceptions import (
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 
 router = APIRouter()
@@ -21,13 +29,24 @@ router = APIRouter()
 
 @router.get("", response_model=List[AddressResponse])
 async def list_addresses(
+    response: Response,
+    pagination: Pagination = Depends(),
     db: MSSQLConnection = Depends(get_db),
-) -> List[AddressResponse]:
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Union[List[AddressResponse], StreamingResponse]:
     """
     **Retrieves the list of addresses.**
     """
     # TODO: Filter by postal code and requirements
-    return await AddressService(db).get_multi()
+    if stream_media_type is not None:
+        return stream_response(
+            AddressService(db).iterate_multi(pagination.after),
+            stream_media_type,
+        )
+    items = await AddressService(db).get_multi(
+        pagination.fetch_limit, pagination.after
+    )
+    return pagination.page(items, response)
 
 
 @router.get(
@@ -105,13 +124,10 @@ async def update_address(
     the entity enclosed in the request body.** On success, the updated address
     is returned in the body of the response.
     """
-    # Check if address with the id exists
-    address = await AddressService(db).get(address_id)
-    if not address:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         address = await AddressService(db).update(address_id, body, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -145,13 +161,10 @@ async def delete_address_by_id(
     """
     **Deletes an address with the id from the `address_id` path parameter.**
     """
-    # Check if address with the id exists
-    address = await AddressService(db).get(address_id)
-    if not address:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform deletion
     try:
         await AddressService(db).delete(address_id, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
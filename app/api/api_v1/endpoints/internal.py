@@ -0,0 +1,161 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from app.api import idempotency
+from app.core.cache import TTLCache
+from app.core.metrics import Histogram
+from app.core.singleflight import SingleFlight
+from app.db import database
+from app.schemas.internal import (
+    CacheStatsResponse,
+    HistogramStatsResponse,
+    PoolStatsResponse,
+    PushDeliveryStatsResponse,
+    SingleFlightStatsResponse,
+    WriteBehindStatsResponse,
+)
+from app.services import search_cache
+from app.services.push_delivery import push_deliveries
+from app.services.vaccine_availability import (
+    availability_searches,
+    availability_writes,
+)
+from app.services.vaccine_availability_locations import nearby_searches
+
+router = APIRouter()
+
+
+def _cache_stats(cache: TTLCache[Any, Any]) -> CacheStatsResponse:
+    return CacheStatsResponse(**cache.stats(), hit_rate=cache.hit_rate)
+
+
+@router.get("/caches", response_model=Dict[str, CacheStatsResponse])
+async def list_cache_stats() -> Dict[str, CacheStatsResponse]:
+    """
+    **Retrieves the hit and miss counters of the in-process caches.**
+    """
+    return {
+        "vaccine_locations": _cache_stats(
+            search_cache.vaccine_locations_cache
+        ),
+        "vaccine_availability": _cache_stats(
+            search_cache.vaccine_availability_cache
+        ),
+        "entity_fragments": _cache_stats(search_cache.entity_fragments),
+        "availability_fingerprints": _cache_stats(
+            search_cache.availability_fingerprints
+        ),
+        "compiled_statements": _cache_stats(database.compiled_statements),
+        "sproc_batches": _cache_stats(database.sproc_batches),
+        "idempotent_responses": _cache_stats(idempotency.idempotent_responses),
+    }
+
+
+def _single_flight_stats(
+    flight: SingleFlight[Any, Any]
+) -> SingleFlightStatsResponse:
+    return SingleFlightStatsResponse(
+        calls=flight.calls,
+        coalesced=flight.coalesced,
+        in_flight=flight.in_flight,
+    )
+
+
+@router.get(
+    "/single-flights", response_model=Dict[str, SingleFlightStatsResponse]
+)
+async def list_single_flight_stats() -> Dict[str, SingleFlightStatsResponse]:
+    """
+    **Retrieves how many identical concurrent searches have been coalesced
+    into a single database query.**
+    """
+    return {
+        "vaccine_locations": _single_flight_stats(nearby_searches),
+        "vaccine_availability": _single_flight_stats(availability_searches),
+        "idempotent_requests": _single_flight_stats(
+            idempotency.idempotent_requests
+        ),
+    }
+
+
+def _histogram_stats(histogram: Histogram) -> HistogramStatsResponse:
+    count = histogram.count
+    return HistogramStatsResponse(
+        count=count,
+        sum=histogram.sum,
+        mean=histogram.sum / count if count else 0.0,
+        p50=histogram.quantile(0.5),
+        p90=histogram.quantile(0.9),
+        p99=histogram.quantile(0.99),
+    )
+
+
+@router.get("/pool", response_model=PoolStatsResponse)
+async def get_pool_stats() -> PoolStatsResponse:
+    """
+    **Retrieves the usage of the database connection pool:** its size, how
+    long acquiring a connection waited, how long connections were held and
+    how many acquires timed out.
+    """
+    db = database.db
+    pool = db.pool
+    metrics = db.metrics
+    size = 0 if pool is None else pool.size
+    free = 0 if pool is None else pool.freesize
+    return PoolStatsResponse(
+        connected=pool is not None,
+        min_size=0 if pool is None else pool.minsize,
+        max_size=0 if pool is None else pool.maxsize,
+        size=size,
+        free=free,
+        in_use=size - free,
+        acquires=metrics.acquires,
+        acquire_timeouts=metrics.acquire_timeouts,
+        acquire_wait_seconds=_histogram_stats(metrics.acquire_wait),
+        checkout_seconds=_histogram_stats(metrics.checkout_duration),
+    )
+
+
+@router.get("/push-deliveries", response_model=PushDeliveryStatsResponse)
+async def get_push_delivery_stats() -> PushDeliveryStatsResponse:
+    """
+    **Retrieves the counters of the push notifications sent in the
+    background and how many are left to send.**
+    """
+    notifications, deliveries, oldest = await push_deliveries.pending()
+    return PushDeliveryStatsResponse(
+        enqueued=push_deliveries.enqueued,
+        suppressed=push_deliveries.suppressed,
+        dropped=push_deliveries.dropped,
+        sent=push_deliveries.sent,
+        failed=push_deliveries.failed,
+        given_up=push_deliveries.given_up,
+        gone=push_deliveries.gone,
+        pruned=push_deliveries.pruned,
+        pending_notifications=notifications,
+        pending_deliveries=deliveries,
+        max_pending_notifications=push_deliveries.max_size,
+        oldest_pending_seconds=oldest,
+        delivery_lag_seconds=_histogram_stats(push_deliveries.delivery_lag),
+    )
+
+
+@router.get("/write-behind", response_model=WriteBehindStatsResponse)
+async def get_write_behind_stats() -> WriteBehindStatsResponse:
+    """
+    **Retrieves the counters of the reports of availabilities buffered to be
+    created in the background and how many are left to create.**
+    """
+    return WriteBehindStatsResponse(
+        enabled=availability_writes.is_running,
+        buffered=availability_writes.buffered,
+        coalesced=availability_writes.coalesced,
+        rejected=availability_writes.rejected,
+        flushed=availability_writes.flushed,
+        flush_failures=availability_writes.flush_failures,
+        pending=len(availability_writes),
+        max_pending=availability_writes.max_pending,
+        oldest_pending_seconds=availability_writes.oldest_pending_seconds,
+        flush_seconds=_histogram_stats(availability_writes.flush_duration),
+    )
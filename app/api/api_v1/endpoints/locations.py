@@ -1,9 +1,17 @@
-from typing import List
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from loguru import logger
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_db,
+    get_stream_media_type,
+)
+from app.api.pagination import Pagination
+from app.api.responses import stream_response
 from app.db.database import MSSQLConnection
 from app.schemas.locations import (
     LocationCreateRequest,
@@ -13,8 +21,10 @@ from app.schemas.locations import (
     LocationUpdateRequest,
 )
 from app.services.exceptions import (
+    DatabaseNotInSyncError,
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 from app.services.locations import LocationService
 
@@ -23,13 +33,30 @@ router = APIRouter()
 
 @router.get("", response_model=List[LocationExpandedResponse])
 async def list_locations(
+    response: Response,
+    pagination: Pagination = Depends(),
     db: MSSQLConnection = Depends(get_db),
-) -> List[LocationExpandedResponse]:
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Union[List[LocationExpandedResponse], StreamingResponse]:
     """
     **Retrieves the list of locations.**
     """
     # TODO: Filter by postal code
-    return await LocationService(db).get_multi_expanded()
+    if stream_media_type is not None:
+        # The response has started by the time a location could be found out
+        # of sync, so the stream is cut short instead of answering 500.
+        return stream_response(
+            LocationService(db).iterate_multi_expanded(pagination.after),
+            stream_media_type,
+        )
+    try:
+        locations = await LocationService(db).get_multi_expanded(
+            pagination.fetch_limit, pagination.after
+        )
+    except DatabaseNotInSyncError as e:
+        logger.warning("Database not in sync: {}", e.message)
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return pagination.page(locations, response)
 
 
 @router.get(
@@ -72,9 +99,15 @@ async def retrieve_locations_by_organization(
     **Retrieves a location with the id from the `organization_id` path
     parameter.**
     """
-    locations = await LocationService(db).get_multi_expanded_org(
-        organization_id
-    )
+    try:
+        locations = await LocationService(db).get_multi_expanded_org(
+            organization_id
+        )
+    except InternalDatabaseError:
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except DatabaseNotInSyncError as e:
+        logger.warning("Database not in sync: {}", e.message)
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
     if locations is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     return locations
@@ -184,13 +217,10 @@ async def update_location(
     with the entity enclosed in the request body.** On success, the updated
     location is returned in the body of the response.
     """
-    # Check if location with the id exists
-    location = await LocationService(db).get(location_id)
-    if not location:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         location = await LocationService(db).update(location_id, body, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -224,13 +254,10 @@ async def delete_location_by_id(
     """
     **Deletes a location with the id from the `location_id` path parameter.**
     """
-    # Check if location with the id exists
-    location = await LocationService(db).get(location_id)
-    if not location:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform deletion
     try:
         await LocationService(db).delete(location_id, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
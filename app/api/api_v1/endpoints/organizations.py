@@ -1,9 +1,16 @@
-from typing import List
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_db,
+    get_stream_media_type,
+)
+from app.api.pagination import Pagination
+from app.api.responses import stream_response
 from app.db.database import MSSQLConnection
 from app.schemas.organizations import (
     OrganizationCreateRequest,
@@ -13,6 +20,7 @@ from app.schemas.organizations import (
 from app.services.exceptions import (
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 from app.services.organizations import OrganizationService
 
@@ -21,13 +29,24 @@ router = APIRouter()
 
 @router.get("", response_model=List[OrganizationResponse])
 async def list_organizations(
+    response: Response,
+    pagination: Pagination = Depends(),
     db: MSSQLConnection = Depends(get_db),
-) -> List[OrganizationResponse]:
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Union[List[OrganizationResponse], StreamingResponse]:
     """
     **Retrieves the list of organizations.**
     """
     # TODO: Filter by name
-    return await OrganizationService(db).get_multi()
+    if stream_media_type is not None:
+        return stream_response(
+            OrganizationService(db).iterate_multi(pagination.after),
+            stream_media_type,
+        )
+    items = await OrganizationService(db).get_multi(
+        pagination.fetch_limit, pagination.after
+    )
+    return pagination.page(items, response)
 
 
 @router.get(
@@ -107,15 +126,12 @@ async def update_organization(
     parameter with the entity enclosed in the request body.** On success,
     the updated organization is returned in the body of the response.
     """
-    # Check if organization with the id exists
-    organization = await OrganizationService(db).get(organization_id)
-    if not organization:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         organization = await OrganizationService(db).update(
             organization_id, body, api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -150,13 +166,10 @@ async def delete_organization_by_id(
     **Deletes an organization with the id from the `organization_id` path
     parameter.**
     """
-    # Check if organization with the id exists
-    organization = await OrganizationService(db).get(organization_id)
-    if not organization:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform deletion
     try:
         await OrganizationService(db).delete(organization_id, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
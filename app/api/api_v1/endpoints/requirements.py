@@ -1,9 +1,16 @@
-from typing import List
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_db,
+    get_stream_media_type,
+)
+from app.api.pagination import Pagination
+from app.api.responses import stream_response
 from app.db.database import MSSQLConnection
 from app.schemas.requirements import (
     RequirementResponse,
@@ -13,6 +20,7 @@ from app.schemas.requirements import (
 from app.services.exceptions import (
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 from app.services.requirements import RequirementService
 
@@ -21,12 +29,23 @@ router = APIRouter()
 
 @router.get("", response_model=List[RequirementResponse])
 async def list_requirements(
+    response: Response,
+    pagination: Pagination = Depends(),
     db: MSSQLConnection = Depends(get_db),
-) -> List[RequirementResponse]:
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Union[List[RequirementResponse], StreamingResponse]:
     """
     **Retrieves the list of requirements.**
     """
-    return await RequirementService(db).get_multi()
+    if stream_media_type is not None:
+        return stream_response(
+            RequirementService(db).iterate_multi(pagination.after),
+            stream_media_type,
+        )
+    items = await RequirementService(db).get_multi(
+        pagination.fetch_limit, pagination.after
+    )
+    return pagination.page(items, response)
 
 
 @router.get(
@@ -106,15 +125,12 @@ async def update_requirement(
     parameter with the entity enclosed in the request body.** On success,
     the updated requirement is returned in the body of the response.
     """
-    # Check if requirement with the id exists
-    requirement = await RequirementService(db).get(requirement_id)
-    if not requirement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         requirement = await RequirementService(db).update(
             requirement_id, body, api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -149,13 +165,10 @@ async def delete_requirement_by_id(
     **Deletes a requirement with the id from the `requirement_id` path
     parameter.**
     """
-    # Check if requirement with the id exists
-    requirement = await RequirementService(db).get(requirement_id)
-    if not requirement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform deletion
     try:
         await RequirementService(db).delete(requirement_id, api_key)
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
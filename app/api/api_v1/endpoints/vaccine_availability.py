@@ -1,5 +1,5 @@
 from datetime import date, datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import (
@@ -11,12 +11,27 @@ from fastapi import (
     Response,
     status,
 )
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_db,
+    get_lazy_db,
+    get_stream_media_type,
+)
+from app.api.pagination import OffsetPagination
+from app.api.responses import (
+    models_response,
+    stream_vaccine_availabilities_response,
+    vaccine_availabilities_response,
+)
+from app.core.config import settings
 from app.db.database import MSSQLConnection
 from app.schemas.vaccine_availability import (
     VaccineAvailabilityCreateRequest,
+    VaccineAvailabilityExpandedBulkCreateRequest,
+    VaccineAvailabilityExpandedBulkCreateResponse,
     VaccineAvailabilityExpandedCreateRequest,
     VaccineAvailabilityExpandedCreateResponse,
     VaccineAvailabilityExpandedResponse,
@@ -35,6 +50,7 @@ from app.services.exceptions import (
     DatabaseNotInSyncError,
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 from app.services.vaccine_availability import VaccineAvailabilityService
 from app.services.vaccine_availability_requirement import (
@@ -44,7 +60,7 @@ from app.services.vaccine_availability_timeslot import (
     VaccineAvailabilityTimeslotService,
 )
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.get("", response_model=List[VaccineAvailabilityExpandedResponse])
@@ -65,8 +81,10 @@ async def list_vaccine_availability(
         min_length=3,
         max_length=3,
     ),
-    db: MSSQLConnection = Depends(get_db),
-) -> List[VaccineAvailabilityExpandedResponse]:
+    pagination: OffsetPagination = Depends(),
+    db: MSSQLConnection = Depends(get_lazy_db),
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Response:
     """
     **Retrieves the list of vaccine availabilities within the vicinity of a
     `postal_code` and after the `min_date`.**
@@ -81,13 +99,27 @@ async def list_vaccine_availability(
         ).get_filtered_multi_expanded(
             postal_code=postal_code,
             min_date=min_date,
+            offset=pagination.offset,
+            # The whole list is streamed
+            limit=None
+            if stream_media_type is not None
+            else pagination.fetch_limit,
         )
     except InternalDatabaseError:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
     except DatabaseNotInSyncError as e:
         logger.warning("Database not in sync: {}", e.message)
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
-    return availabilities
+    # Built from database rows, so not validated against the response model
+    # The search is assembled from several result sets, so only the
+    # serialization can be streamed.
+    if stream_media_type is not None:
+        return stream_vaccine_availabilities_response(
+            availabilities, stream_media_type
+        )
+    response = vaccine_availabilities_response(pagination.page(availabilities))
+    pagination.set_next_cursor(response)
+    return response
 
 
 @router.get("/location/", response_model=List[VaccineAvailabilityResponse])
@@ -104,8 +136,9 @@ async def list_vaccine_availability_location(
         title="Location ID",
         description="**Location searching for**",
     ),
+    pagination: OffsetPagination = Depends(),
     db: MSSQLConnection = Depends(get_db),
-) -> List[VaccineAvailabilityResponse]:
+) -> Response:
     """
     **Retrieves the list of vaccine availabilities of a
     `locationid` and after the `min_date`.**
@@ -118,13 +151,18 @@ async def list_vaccine_availability_location(
         availabilities = await VaccineAvailabilityService(db).get_by_location(
             locationID=locationID,
             min_date=min_date,
+            offset=pagination.offset,
+            limit=pagination.fetch_limit,
         )
     except InternalDatabaseError:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
     except DatabaseNotInSyncError as e:
         logger.warning("Database not in sync: {}", e.message)
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
-    return availabilities
+    # Built from database rows, so not validated against the response model
+    response = models_response(pagination.page(availabilities))
+    pagination.set_next_cursor(response)
+    return response
 
 
 @router.get(
@@ -188,6 +226,9 @@ async def create_vaccine_availability(
     "/locations/key/{external_key}",
     response_model=VaccineAvailabilityExpandedCreateResponse,
     responses={
+        status.HTTP_202_ACCEPTED: {
+            "description": "The vaccine availability will be created shortly."
+        },
         status.HTTP_401_UNAUTHORIZED: {"description": "Invalid credentials."},
         status.HTTP_403_FORBIDDEN: {
             "description": "Invalid permissions or credentials."
@@ -199,20 +240,23 @@ async def create_vaccine_availability_expanded_key(
     body: VaccineAvailabilityExpandedCreateRequest,
     db: MSSQLConnection = Depends(get_db),
     api_key: UUID = Depends(get_api_key),
-) -> VaccineAvailabilityExpandedCreateResponse:
+) -> Union[VaccineAvailabilityExpandedCreateResponse, Response]:
     """
     **Creates a new vaccine availability with the entity enclosed in the
     request body.** On success, the new vaccine availability is returned in the
-    body of the response.
+    body of the response. If it is the same as the last one reported for the
+    location, date and vaccine, that one is returned with the response code
+    -2 instead. If it was buffered to be created along with the reports
+    that follow it shortly, nothing is returned, with the status code 202.
     """
     try:
-        availability: VaccineAvailabilityExpandedCreateResponse = (
-            await VaccineAvailabilityService(db).create_expanded(
-                va_expanded=body,
-                external_key=external_key,
-                locationID=None,
-                auth_key=api_key,
-            )
+        availability: Optional[
+            VaccineAvailabilityExpandedCreateResponse
+        ] = await VaccineAvailabilityService(db).create_expanded(
+            va_expanded=body,
+            external_key=external_key,
+            locationID=None,
+            auth_key=api_key,
         )
 
     except InvalidAuthenticationKeyForRequest as e:
@@ -220,13 +264,59 @@ async def create_vaccine_availability_expanded_key(
     except InternalDatabaseError:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    if availability is None:
+        return Response(status_code=status.HTTP_202_ACCEPTED)
     return availability
 
 
+@router.post(
+    "/locations/bulk",
+    response_model=List[VaccineAvailabilityExpandedBulkCreateResponse],
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Invalid credentials."},
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Invalid permissions or credentials."
+        },
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {
+            "description": "Too many vaccine availabilities."
+        },
+    },
+)
+async def create_vaccine_availabilities_expanded_key(
+    body: List[VaccineAvailabilityExpandedBulkCreateRequest],
+    db: MSSQLConnection = Depends(get_db),
+    api_key: UUID = Depends(get_api_key),
+) -> List[VaccineAvailabilityExpandedBulkCreateResponse]:
+    """
+    **Creates the vaccine availabilities enclosed in the request body, each
+    for the location of its external key.** The response code of each of
+    them is returned in order, -1 for the ones that couldn't be created and
+    -2 for the ones that are the same as the last ones reported, which
+    aren't created again.
+    """
+    if len(body) > settings.BULK_INGEST_MAX_ITEMS:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {settings.BULK_INGEST_MAX_ITEMS} vaccine "
+            "availabilities can be created at once.",
+        )
+    try:
+        availabilities = await VaccineAvailabilityService(
+            db
+        ).create_expanded_many(body, api_key)
+    except InvalidAuthenticationKeyForRequest as e:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
+
+    return availabilities
+
+
 @router.post(
     "/locations/id/{location_id}",
     response_model=VaccineAvailabilityExpandedCreateResponse,
     responses={
+        status.HTTP_202_ACCEPTED: {
+            "description": "The vaccine availability will be created shortly."
+        },
         status.HTTP_401_UNAUTHORIZED: {"description": "Invalid credentials."},
         status.HTTP_403_FORBIDDEN: {
             "description": "Invalid permissions or credentials."
@@ -238,20 +328,23 @@ async def create_vaccine_availability_expanded(
     body: VaccineAvailabilityExpandedCreateRequest,
     db: MSSQLConnection = Depends(get_db),
     api_key: UUID = Depends(get_api_key),
-) -> VaccineAvailabilityExpandedCreateResponse:
+) -> Union[VaccineAvailabilityExpandedCreateResponse, Response]:
     """
     **Creates a new vaccine availability with the entity enclosed in the
     request body.** On success, the new vaccine availability is returned in the
-    body of the response.
+    body of the response. If it is the same as the last one reported for the
+    location, date and vaccine, that one is returned with the response code
+    -2 instead. If it was buffered to be created along with the reports
+    that follow it shortly, nothing is returned, with the status code 202.
     """
     try:
-        availability: VaccineAvailabilityExpandedCreateResponse = (
-            await VaccineAvailabilityService(db).create_expanded(
-                va_expanded=body,
-                locationID=location_id,
-                external_key=None,
-                auth_key=api_key,
-            )
+        availability: Optional[
+            VaccineAvailabilityExpandedCreateResponse
+        ] = await VaccineAvailabilityService(db).create_expanded(
+            va_expanded=body,
+            locationID=location_id,
+            external_key=None,
+            auth_key=api_key,
         )
 
     except InvalidAuthenticationKeyForRequest as e:
@@ -259,6 +352,8 @@ async def create_vaccine_availability_expanded(
     except InternalDatabaseError:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    if availability is None:
+        return Response(status_code=status.HTTP_202_ACCEPTED)
     return availability
 
 
@@ -288,17 +383,12 @@ async def update_vaccine_availability(
     request body.** On success, the updated vaccine availability is returned in
     the body of the response.
     """
-    # Check if vaccine availability with the id exists
-    availability = await VaccineAvailabilityService(db).get(
-        vaccine_availability_id
-    )
-    if not availability:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         availability = await VaccineAvailabilityService(db).update(
             identifier=vaccine_availability_id, params=body, auth_key=api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -333,17 +423,12 @@ async def delete_vaccine_availability_by_id(
     **Deletes a vaccine availability with the id from the
     `vaccine_availability_id` path parameter.**
     """
-    # Check if vaccine availability with the id exists
-    availability = await VaccineAvailabilityService(db).get(
-        vaccine_availability_id
-    )
-    if not availability:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform deletion
     try:
         await VaccineAvailabilityService(db).delete(
             vaccine_availability_id, api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -422,6 +507,51 @@ async def create_timeslot_for_vaccine_availability_by_id(
     return timeslot
 
 
+@router.post(
+    "/{vaccine_availability_id}/timeslots/batch",
+    response_model=List[VaccineAvailabilityTimeslotResponse],
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Invalid credentials."},
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Invalid permissions or credentials."
+        },
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {
+            "description": "Too many timeslots."
+        },
+    },
+)
+async def create_timeslots_for_vaccine_availability_by_id(
+    body: List[VaccineAvailabilityTimeslotCreateRequest],
+    vaccine_availability_id: UUID = Path(
+        ...,
+        description="Timeslots for a vaccine availability with this id.",
+    ),
+    db: MSSQLConnection = Depends(get_db),
+    api_key: UUID = Depends(get_api_key),
+) -> List[VaccineAvailabilityTimeslotResponse]:
+    """
+    **Creates the timeslots enclosed in the request body for a vaccine
+    availability with an ID of `vaccine_availability_id` from the path.** On
+    success, the new timeslots are returned in order in the body of the
+    response. Either every timeslot is created or none is.
+    """
+    if len(body) > settings.BULK_INGEST_MAX_ITEMS:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {settings.BULK_INGEST_MAX_ITEMS} timeslots can be "
+            "created at once.",
+        )
+    try:
+        timeslots = await VaccineAvailabilityTimeslotService(db).create_many(
+            vaccine_availability_id, body, api_key
+        )
+    except InvalidAuthenticationKeyForRequest as e:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
+    except InternalDatabaseError:
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return timeslots
+
+
 @router.put(
     "/{vaccine_availability_id}/timeslots/{timeslot_id}",
     response_model=VaccineAvailabilityTimeslotResponse,
@@ -455,15 +585,12 @@ async def update_timeslot_for_vaccine_availability_by_id(
     from the path.** On success, the updated timeslot is returned in the body
     of the response.
     """
-    # Check if timeslot with the id exists
-    timeslot = await VaccineAvailabilityTimeslotService(db).get(timeslot_id)
-    if not timeslot:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         timeslot = await VaccineAvailabilityTimeslotService(db).update(
             identifier=timeslot_id, params=body, auth_key=api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -502,15 +629,12 @@ async def delete_timeslot_for_vaccine_availability_by_id(
     **Deletes a timeslot with the id from the
     `timeslot_id` path parameter.**
     """
-    # Check if timeslot with the id exists
-    timeslot = await VaccineAvailabilityTimeslotService(db).get(timeslot_id)
-    if not timeslot:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform delete
     try:
         await VaccineAvailabilityTimeslotService(db).delete(
             identifier=timeslot_id, auth_key=api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -626,17 +750,12 @@ async def update_requirement_for_vaccine_availability_by_id(
     requirement is returned in the body of the response.
     """
     # TODO: Check vaccine_availability_id against body
-    # Check if vaccine availability requirement with the id exists
-    requirement = await VaccineAvailabilityRequirementService(db).get(
-        requirement_id
-    )
-    if not requirement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform update
     try:
         requirement = await VaccineAvailabilityRequirementService(db).update(
             requirement_id, body, api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -675,17 +794,12 @@ async def delete_requirement_for_vaccine_availability_by_id(
     **Deletes a requirement with the id from the
     `timeslot_id` path parameter.**
     """
-    # Check if timeslot with the id exists
-    requirement = await VaccineAvailabilityRequirementService(db).get(
-        requirement_id
-    )
-    if not requirement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    # Perform delete
     try:
         await VaccineAvailabilityRequirementService(db).delete(
             identifier=requirement_id, auth_key=api_key
         )
+    except ObjectNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
     except InvalidAuthenticationKeyForRequest as e:
         raise HTTPException(status.HTTP_403_FORBIDDEN, e.message)
     except InternalDatabaseError:
@@ -11,9 +11,19 @@ from fastapi import (
     Response,
     status,
 )
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 
-from app.api.dependencies import get_api_key, get_db
+from app.api.dependencies import (
+    get_api_key,
+    get_lazy_db,
+    get_stream_media_type,
+)
+from app.api.pagination import OffsetPagination
+from app.api.responses import (
+    stream_vaccine_locations_response,
+    vaccine_locations_response,
+)
 from app.db.database import MSSQLConnection
 from app.schemas.vaccine_availability import VaccineLocationExpandedResponse
 from app.services.exceptions import (
@@ -24,7 +34,7 @@ from app.services.exceptions import (
 from app.services.vaccine_availability import VaccineAvailabilityService
 from app.services.vaccine_availability_locations import VaccineLocationsService
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.get("", response_model=List[VaccineLocationExpandedResponse])
@@ -52,8 +62,10 @@ async def list_vaccine_locations(
         "with no remaining vaccines**"
         "<br/><br/>Valid example(s): *true; false;* ",
     ),
-    db: MSSQLConnection = Depends(get_db),
-) -> List[VaccineLocationExpandedResponse]:
+    pagination: OffsetPagination = Depends(),
+    db: MSSQLConnection = Depends(get_lazy_db),
+    stream_media_type: Optional[str] = Depends(get_stream_media_type),
+) -> Response:
     """
     **Retrieves the list of vaccine availabilities within the vicinity of a
     `postal_code` and after the `min_date`.**
@@ -69,10 +81,24 @@ async def list_vaccine_locations(
             postal_code=postal_code,
             min_date=min_date,
             include_empty=include_empty,
+            offset=pagination.offset,
+            # The whole list is streamed
+            limit=None
+            if stream_media_type is not None
+            else pagination.fetch_limit,
         )
     except InternalDatabaseError:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
     except DatabaseNotInSyncError as e:
         logger.warning("Database not in sync: {}", e.message)
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
-    return availabilities
+    # Built from database rows, so not validated against the response model
+    # The search is assembled from several result sets, so only the
+    # serialization can be streamed.
+    if stream_media_type is not None:
+        return stream_vaccine_locations_response(
+            availabilities, stream_media_type
+        )
+    response = vaccine_locations_response(pagination.page(availabilities))
+    pagination.set_next_cursor(response)
+    return response
@@ -1,29 +1,81 @@
 from typing import AsyncGenerator, Optional
 from uuid import UUID
 
-from fastapi import HTTPException, Security, status
+from fastapi import HTTPException, Query, Request, Security, status
 from fastapi.security import APIKeyHeader
 
+from app.api.responses import NDJSON_MEDIA_TYPE
 from app.core.config import settings
 from app.db.database import MSSQLConnection, db
 
 auth_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 
+def _ensure_connected() -> None:
+    # The database is connected in the background after startup.
+    if not db.is_connected:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "The database connection isn't established yet.",
+        )
+
+
 async def get_db() -> AsyncGenerator[MSSQLConnection, None]:
     """
     Returns a database object that will subsequently be used for making queries
     to the database for each HTTP request.
     """
+    _ensure_connected()
     connection = db.connection
+    # Acquired outside of the try, so that a connection that couldn't be
+    # acquired (e.g. a pool timeout) isn't released.
+    await connection.acquire(autocommit=True)
 
     try:
-        await connection.acquire(autocommit=True)
         yield connection
     finally:
         await connection.release()
 
 
+async def get_lazy_db() -> AsyncGenerator[MSSQLConnection, None]:
+    """
+    Returns a database object like `get_db`, except that a connection is only
+    taken from the pool once the first query is made. Requests answered from
+    a cache or by a coalesced query never hold a pooled connection.
+    """
+    _ensure_connected()
+    connection = db.connection
+    connection.acquire_on_demand(autocommit=True)
+
+    try:
+        yield connection
+    finally:
+        if connection.is_acquired:
+            await connection.release()
+
+
+async def get_stream_media_type(
+    request: Request,
+    stream: bool = Query(
+        False,
+        title="Stream",
+        description="**Stream the list as a JSON array instead of building "
+        "it first.** Set the `Accept` header to `application/x-ndjson` to "
+        "stream it as newline-delimited JSON instead."
+        "<br/><br/>Valid example(s): *true; false;* ",
+    ),
+) -> Optional[str]:
+    """
+    Returns the media type to stream a list response as, or None if the list
+    is not to be streamed.
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return NDJSON_MEDIA_TYPE
+    if stream:
+        return "application/json"
+    return None
+
+
 async def get_api_key(
     auth_value: Optional[str] = Security(auth_header),
 ) -> UUID:
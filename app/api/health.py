@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, Request, Response, status
+from loguru import logger
+
+from app.core.config import settings
+from app.db.database import db
+from app.schemas.health import HealthResponse
+
+router = APIRouter()
+
+
+@router.get("/live", response_model=HealthResponse)
+async def live() -> HealthResponse:
+    """
+    **Reports that the worker is running and its event loop is responsive.**
+    """
+    return HealthResponse(status="live")
+
+
+@router.get(
+    "/ready",
+    response_model=HealthResponse,
+    responses={
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "model": HealthResponse,
+            "description": "The worker can't serve requests yet.",
+        }
+    },
+)
+async def ready(request: Request, response: Response) -> HealthResponse:
+    """
+    **Reports whether the worker can serve requests:** its database pool has
+    its minimum number of connections open and a probe query succeeds.
+    """
+    pool = db.pool
+    if pool is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(status="starting", detail="Not connected")
+    if pool.size < pool.minsize:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(
+            status="starting",
+            detail=f"{pool.size} of {pool.minsize} connections open",
+        )
+    try:
+        await asyncio.wait_for(db.probe(), settings.DB_PROBE_TIMEOUT)
+    except Exception as e:
+        logger.warning("Readiness probe failed: {!r}", e)
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(status="unavailable", detail="Probe failed")
+
+    state = request.app.state
+    if getattr(state, "ready_after", None) is None:
+        state.ready_after = time.monotonic() - state.started_at
+        logger.info("Ready to serve {:.2f}s after startup", state.ready_after)
+    return HealthResponse(status="ready", startup_seconds=state.ready_after)
@@ -0,0 +1,184 @@
+import hashlib
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+# Set on the responses replayed from a previous request.
+IDEMPOTENT_REPLAYED_HEADER = "idempotent-replayed"
+
+# Methods of the requests that may write, whose responses are replayed.
+WRITE_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+
+
+class StoredResponse(NamedTuple):
+    # Fingerprint of the method, path and body of the request
+    fingerprint: bytes
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    # Endpoint of the route that handled the request, for the metrics
+    endpoint: Any
+
+
+IdempotencyKey = Tuple[bytes, bytes]
+
+# Completed responses by authorization header and idempotency key.
+idempotent_responses: TTLCache[IdempotencyKey, StoredResponse] = TTLCache(
+    settings.IDEMPOTENCY_CACHE_MAX_SIZE, settings.IDEMPOTENCY_TTL
+)
+
+idempotent_requests: SingleFlight[
+    IdempotencyKey, Optional[StoredResponse]
+] = SingleFlight()
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return bytes(value)
+    return None
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the response of a write request that was made with the same
+    `Idempotency-Key` header and authorization, so that the requests retried
+    by clients aren't processed again. A request made while the first one
+    with its key is still in flight waits for that response. Responses are
+    stored for `IDEMPOTENCY_TTL` seconds, except the server errors, and reusing
+    a key for a different request is refused.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope, IDEMPOTENCY_KEY_HEADER.encode())
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > settings.IDEMPOTENCY_KEY_MAX_LENGTH:
+            response = JSONResponse(
+                {
+                    "detail": "The Idempotency-Key header is longer than "
+                    f"{settings.IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+                },
+                status.HTTP_400_BAD_REQUEST,
+            )
+            await response(scope, receive, send)
+            return
+
+        # The body is read first to tell a retry from another request.
+        messages: List[Message] = []
+        body = hashlib.blake2b(digest_size=16)
+        body.update(scope["method"].encode())
+        body.update(b"\0" + scope["path"].encode() + b"\0")
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        fingerprint = body.digest()
+
+        async def replay_receive() -> Message:
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        key = (_header(scope, b"authorization") or b"", idempotency_key)
+        stored = idempotent_responses.get(key)
+        if stored is None:
+            sent = False
+
+            async def call() -> Optional[StoredResponse]:
+                nonlocal sent
+                sent = True
+                return await self._call_and_store(
+                    key, fingerprint, scope, replay_receive, send
+                )
+
+            try:
+                stored = await idempotent_requests.do(key, call)
+            except Exception:
+                if sent:
+                    raise
+                stored = None
+            if sent:
+                return
+            if stored is None:
+                # The request in flight failed, so this one is processed.
+                await self.app(scope, replay_receive, send)
+                return
+
+        if stored.fingerprint != fingerprint:
+            response = JSONResponse(
+                {
+                    "detail": "The Idempotency-Key header was already used "
+                    "for a different request."
+                },
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+            await response(scope, receive, send)
+            return
+        if stored.endpoint is not None:
+            scope["endpoint"] = stored.endpoint
+        await send(
+            {
+                "type": "http.response.start",
+                "status": stored.status,
+                "headers": [
+                    *stored.headers,
+                    (IDEMPOTENT_REPLAYED_HEADER.encode(), b"true"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def _call_and_store(
+        self,
+        key: IdempotencyKey,
+        fingerprint: bytes,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> Optional[StoredResponse]:
+        response_status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def send_and_record(message: Message) -> None:
+            nonlocal response_status, headers
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+        if response_status >= 500:
+            return None
+        stored = StoredResponse(
+            fingerprint,
+            response_status,
+            headers,
+            b"".join(chunks),
+            scope.get("endpoint"),
+        )
+        idempotent_responses.set(key, stored)
+        return stored
@@ -0,0 +1,328 @@
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api import idempotency
+from app.core.cache import TTLCache
+from app.core.metrics import (
+    render_histograms,
+    render_samples,
+    request_duration,
+    sproc_duration,
+)
+from app.db import database
+from app.services import search_cache
+from app.services.push_delivery import push_deliveries
+from app.services.vaccine_availability import availability_writes
+
+# Content type of version 0.0.4 of the Prometheus text format.
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+# Path label of the requests that didn't match any route, so that the paths
+# probed by crawlers don't each get their own histogram.
+UNMATCHED_PATH = "<unmatched>"
+
+router = APIRouter()
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the duration of every HTTP request by method, templated route
+    path and status code.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # The routes are only known once the application has been set up.
+        self._paths: Dict[Callable[..., Any], str] = {}
+
+    def _path(self, scope: Scope) -> str:
+        # The router stores the endpoint of the matched route in the scope.
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_PATH
+        path = self._paths.get(endpoint)
+        if path is not None:
+            return path
+        routes: List[BaseRoute] = scope["app"].routes
+        self._paths = {
+            getattr(route, "endpoint"): getattr(route, "path")
+            for route in routes
+            if hasattr(route, "endpoint") and hasattr(route, "path")
+        }
+        return self._paths.get(endpoint, UNMATCHED_PATH)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_duration.labels(
+                scope["method"], self._path(scope), str(status_code)
+            ).observe(time.monotonic() - started_at)
+
+
+def _cache_samples(
+    caches: Dict[str, TTLCache[Any, Any]], attribute: str
+) -> Iterable[Tuple[Tuple[str], float]]:
+    return (
+        ((name,), getattr(cache, attribute)) for name, cache in caches.items()
+    )
+
+
+def _render_caches() -> List[str]:
+    caches: Dict[str, TTLCache[Any, Any]] = {
+        "vaccine_locations": search_cache.vaccine_locations_cache,
+        "vaccine_availability": search_cache.vaccine_availability_cache,
+        "entity_fragments": search_cache.entity_fragments,
+        "availability_fingerprints": search_cache.availability_fingerprints,
+        "compiled_statements": database.compiled_statements,
+        "sproc_batches": database.sproc_batches,
+        "idempotent_responses": idempotency.idempotent_responses,
+    }
+    labelnames = ("cache",)
+    return [
+        *render_samples(
+            "cache_hits_total",
+            "Lookups of the in-process caches that found an entry.",
+            "counter",
+            labelnames,
+            _cache_samples(caches, "hits"),
+        ),
+        *render_samples(
+            "cache_misses_total",
+            "Lookups of the in-process caches that found no entry.",
+            "counter",
+            labelnames,
+            _cache_samples(caches, "misses"),
+        ),
+        *render_samples(
+            "cache_evictions_total",
+            "Entries evicted from the in-process caches.",
+            "counter",
+            labelnames,
+            _cache_samples(caches, "evictions"),
+        ),
+        *render_samples(
+            "cache_size",
+            "Entries held by the in-process caches.",
+            "gauge",
+            labelnames,
+            (((name,), len(cache)) for name, cache in caches.items()),
+        ),
+    ]
+
+
+def _render_pool() -> List[str]:
+    db = database.db
+    pool = db.pool
+    metrics = db.metrics
+    size = 0 if pool is None else pool.size
+    free = 0 if pool is None else pool.freesize
+    gauges = {
+        "db_pool_min_size": (
+            "Minimum number of pooled connections.",
+            0 if pool is None else pool.minsize,
+        ),
+        "db_pool_max_size": (
+            "Maximum number of pooled connections.",
+            0 if pool is None else pool.maxsize,
+        ),
+        "db_pool_size": ("Open pooled connections.", size),
+        "db_pool_free": ("Pooled connections free to be acquired.", free),
+        "db_pool_in_use": ("Pooled connections acquired.", size - free),
+    }
+    lines: List[str] = []
+    for name, (documentation, value) in gauges.items():
+        lines.extend(
+            render_samples(name, documentation, "gauge", (), [((), value)])
+        )
+    lines.extend(
+        [
+            *render_samples(
+                "db_pool_acquires_total",
+                "Attempts to acquire a pooled connection.",
+                "counter",
+                (),
+                [((), metrics.acquires)],
+            ),
+            *render_samples(
+                "db_pool_acquire_timeouts_total",
+                "Attempts to acquire a pooled connection that timed out.",
+                "counter",
+                (),
+                [((), metrics.acquire_timeouts)],
+            ),
+            *render_histograms(
+                "db_pool_acquire_wait_seconds",
+                "Time waited for a pooled connection to be free.",
+                (),
+                [((), metrics.acquire_wait)],
+            ),
+            *render_histograms(
+                "db_pool_checkout_seconds",
+                "Time pooled connections were held once acquired.",
+                (),
+                [((), metrics.checkout_duration)],
+            ),
+        ]
+    )
+    return lines
+
+
+async def _render_push_deliveries() -> List[str]:
+    notifications, deliveries, oldest = await push_deliveries.pending()
+    lines: List[str] = []
+    counters = {
+        "webpush_enqueued_total": (
+            "Notifications recorded to be sent.",
+            push_deliveries.enqueued,
+        ),
+        "webpush_suppressed_total": (
+            "Notifications coalesced into a recent one of their area.",
+            push_deliveries.suppressed,
+        ),
+        "webpush_dropped_total": (
+            "Notifications dropped because too many were pending.",
+            push_deliveries.dropped,
+        ),
+        "webpush_sent_total": (
+            "Notifications sent to a subscription.",
+            push_deliveries.sent,
+        ),
+        "webpush_failed_total": (
+            "Attempts to send a notification that failed.",
+            push_deliveries.failed,
+        ),
+        "webpush_given_up_total": (
+            "Notifications not sent after every attempt failed.",
+            push_deliveries.given_up,
+        ),
+        "webpush_gone_total": (
+            "Notifications to subscriptions that no longer exist.",
+            push_deliveries.gone,
+        ),
+        "webpush_pruned_total": (
+            "Subscriptions deleted because they no longer exist.",
+            push_deliveries.pruned,
+        ),
+    }
+    for name, (documentation, value) in counters.items():
+        lines.extend(
+            render_samples(name, documentation, "counter", (), [((), value)])
+        )
+    gauges: Dict[str, Tuple[str, float]] = {
+        "webpush_pending_notifications": (
+            "Notifications of postal codes left to fan out.",
+            notifications,
+        ),
+        "webpush_pending_deliveries": (
+            "Notifications left to send to a subscription.",
+            deliveries,
+        ),
+        "webpush_oldest_pending_seconds": (
+            "Age of the oldest notification left to send.",
+            0.0 if oldest is None else oldest,
+        ),
+    }
+    for name, (documentation, gauge) in gauges.items():
+        lines.extend(
+            render_samples(name, documentation, "gauge", (), [((), gauge)])
+        )
+    lines.extend(
+        render_histograms(
+            "webpush_delivery_lag_seconds",
+            "Time from a notification being recorded to it being sent.",
+            (),
+            [((), push_deliveries.delivery_lag)],
+        )
+    )
+    return lines
+
+
+def _render_write_behind() -> List[str]:
+    lines: List[str] = []
+    counters = {
+        "availability_write_behind_buffered_total": (
+            "Reports of availabilities buffered to be created.",
+            availability_writes.buffered,
+        ),
+        "availability_write_behind_coalesced_total": (
+            "Buffered reports superseded by a later one.",
+            availability_writes.coalesced,
+        ),
+        "availability_write_behind_rejected_total": (
+            "Reports created right away because the buffer was full.",
+            availability_writes.rejected,
+        ),
+        "availability_write_behind_flushed_total": (
+            "Buffered reports flushed to the database.",
+            availability_writes.flushed,
+        ),
+        "availability_write_behind_flush_failures_total": (
+            "Flushes of buffered reports that failed.",
+            availability_writes.flush_failures,
+        ),
+    }
+    for name, (documentation, value) in counters.items():
+        lines.extend(
+            render_samples(name, documentation, "counter", (), [((), value)])
+        )
+    lines.extend(
+        [
+            *render_samples(
+                "availability_write_behind_pending",
+                "Buffered reports left to flush.",
+                "gauge",
+                (),
+                [((), len(availability_writes))],
+            ),
+            *render_histograms(
+                "availability_write_behind_flush_seconds",
+                "Duration of the flushes of buffered reports.",
+                (),
+                [((), availability_writes.flush_duration)],
+            ),
+        ]
+    )
+    return lines
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+)
+async def get_metrics() -> PlainTextResponse:
+    """
+    **Renders the metrics of this instance in the Prometheus text format.**
+    """
+    lines = [
+        *request_duration.render(),
+        *sproc_duration.render(),
+        *_render_caches(),
+        *_render_pool(),
+        *await _render_push_deliveries(),
+        *_render_write_behind(),
+    ]
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type=PROMETHEUS_MEDIA_TYPE
+    )
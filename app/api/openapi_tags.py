@@ -31,4 +31,12 @@ openapi_tags = [
         "name": "WebPush",
         "description": "Push notifications",
     },
+    {
+        "name": "Internal",
+        "description": "Operational statistics about this instance.",
+    },
+    {
+        "name": "Health",
+        "description": "Liveness and readiness probes of this instance.",
+    },
 ]
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException, Query, Response, status
+
+from app.core.config import settings
+
+# Response header holding the cursor of the next page, if there is one.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+ItemType = TypeVar("ItemType")
+
+
+def encode_cursor(after: int, field: str = "after") -> str:
+    encoded = base64.urlsafe_b64encode(json.dumps({field: after}).encode())
+    return encoded.decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, field: str = "after") -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode()))[field]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(after, int):
+        raise ValueError("Invalid cursor")
+    return after
+
+
+class Pagination:
+    """
+    The page of a list requested with the `limit` and `cursor` query
+    parameters. Pages are ordered by id, and the cursor of the next page is
+    returned in the `X-Next-Cursor` header. Pages hold `PAGE_SIZE_DEFAULT`
+    items unless a limit is given.
+    """
+
+    # Field of the cursor holding the position after which the page starts
+    cursor_field = "after"
+
+    def __init__(
+        self,
+        limit: int = Query(
+            settings.PAGE_SIZE_DEFAULT,
+            title="Limit",
+            description="**The maximum number of items to return.** Ignored "
+            "when the list is streamed.",
+            ge=1,
+            le=settings.PAGE_SIZE_MAX,
+        ),
+        cursor: Optional[str] = Query(
+            None,
+            title="Cursor",
+            description="**Return the page following the cursor.** The "
+            "cursor of the next page is given by the `X-Next-Cursor` header "
+            "of a response, which is absent on the last page.",
+        ),
+    ) -> None:
+        self.limit = limit
+        self.after: Optional[int] = None
+        self.next_cursor: Optional[str] = None
+        if cursor is not None:
+            try:
+                self.after = decode_cursor(cursor, self.cursor_field)
+            except ValueError as e:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+    @property
+    def fetch_limit(self) -> int:
+        # One more item than the limit tells whether there is a next page.
+        return self.limit + 1
+
+    def page(
+        self, items: Sequence[ItemType], response: Optional[Response] = None
+    ) -> List[ItemType]:
+        """
+        Returns the items of the page out of `fetch_limit` items, and sets the
+        cursor of the next page on `response` if there is one.
+        """
+        if len(items) <= self.limit:
+            return list(items)
+        page = list(items[: self.limit])
+        self.next_cursor = encode_cursor(
+            self._next_position(page), self.cursor_field
+        )
+        if response is not None:
+            self.set_next_cursor(response)
+        return page
+
+    def _next_position(self, page: List[Any]) -> int:
+        last_id: int = page[-1].id
+        return last_id
+
+    def set_next_cursor(self, response: Response) -> None:
+        if self.next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+
+
+class OffsetPagination(Pagination):
+    """
+    The page of a list that isn't ordered by id, e.g. a nearby search, where
+    the cursor holds the number of items before the page rather than an id.
+    The `fetch_limit` items are read from `offset` on.
+    """
+
+    cursor_field = "offset"
+
+    @property
+    def offset(self) -> int:
+        return self.after or 0
+
+    def _next_position(self, page: List[Any]) -> int:
+        return self.offset + len(page)
@@ -0,0 +1,247 @@
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from app.schemas.addresses import AddressResponse
+from app.schemas.locations import LocationExpandedResponse
+from app.schemas.organizations import OrganizationResponse
+from app.schemas.vaccine_availability import (
+    VaccineAvailabilityExpandedResponse,
+    VaccineLocationExpandedResponse,
+)
+from app.services import search_cache
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+
+def _dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=pydantic_encoder)
+
+
+def _alias(model: BaseModel, field: str) -> bytes:
+    return orjson.dumps(model.__fields__[field].alias)
+
+
+def _splice(encoded: bytes, fragments: Dict[bytes, bytes]) -> bytes:
+    """
+    Adds already encoded values to an encoded JSON object, given the encoded
+    key of each.
+    """
+    members = b",".join(key + b":" + value for key, value in fragments.items())
+    if encoded == b"{}":
+        return b"{" + members + b"}"
+    return encoded[:-1] + b"," + members + b"}"
+
+
+def _fragment(
+    model: BaseModel,
+    kind: str,
+    tags: Callable[[], Iterable[str]],
+    encode: Callable[[], bytes],
+) -> bytes:
+    """
+    Returns the encoded `model` from the fragment cache, encoding and caching
+    it first if needed. The fragments are keyed by the id and creation date of
+    the entity and evicted with the search results on writes.
+    """
+    key = (kind, getattr(model, "id"), getattr(model, "created_at"))
+    fragment = search_cache.entity_fragments.get(key)
+    if fragment is None:
+        fragment = encode()
+        search_cache.entity_fragments.set(key, fragment, tags=tags())
+    return fragment
+
+
+def _organization_fragment(
+    organization: Optional[OrganizationResponse],
+) -> bytes:
+    if organization is None:
+        return b"null"
+    # Bound for the lambdas, which don't keep the narrowed type
+    model = organization
+    return _fragment(
+        model,
+        "organization",
+        lambda: [search_cache.organization_tag(model.id)],
+        lambda: _dumps(model.dict(by_alias=True)),
+    )
+
+
+def _address_fragment(address: Optional[AddressResponse]) -> bytes:
+    if address is None:
+        return b"null"
+    # Bound for the lambdas, which don't keep the narrowed type
+    model = address
+    return _fragment(
+        model,
+        "address",
+        lambda: [search_cache.address_tag(model.id)],
+        lambda: _dumps(model.dict(by_alias=True)),
+    )
+
+
+def _location_fragment(location: LocationExpandedResponse) -> bytes:
+    def encode() -> bytes:
+        fields = location.dict(
+            by_alias=True,
+            include=set(LocationExpandedResponse.__fields__)
+            - {"address", "organization"},
+        )
+        return _splice(
+            _dumps(fields),
+            {
+                _alias(location, "address"): _address_fragment(
+                    location.address
+                ),
+                _alias(location, "organization"): _organization_fragment(
+                    location.organization
+                ),
+            },
+        )
+
+    def tags() -> Iterable[str]:
+        tags = [search_cache.location_tag(location.id)]
+        if location.address is not None:
+            tags.append(search_cache.address_tag(location.address.id))
+        if location.organization is not None:
+            tags.append(
+                search_cache.organization_tag(location.organization.id)
+            )
+        return tags
+
+    return _fragment(location, "location", tags, encode)
+
+
+def _vaccine_location(location: VaccineLocationExpandedResponse) -> bytes:
+    availabilities = _dumps(
+        [
+            availability.dict(by_alias=True)
+            for availability in location.vaccine_availabilities
+        ]
+    )
+    return _splice(
+        _location_fragment(location),
+        {_alias(location, "vaccine_availabilities"): availabilities},
+    )
+
+
+def _vaccine_availability(
+    availability: VaccineAvailabilityExpandedResponse,
+) -> bytes:
+    fields = availability.dict(
+        by_alias=True,
+        include=set(VaccineAvailabilityExpandedResponse.__fields__)
+        - {"location"},
+    )
+    return _splice(
+        _dumps(fields),
+        {
+            _alias(availability, "location"): _location_fragment(
+                availability.location
+            )
+        },
+    )
+
+
+def _model(model: BaseModel) -> bytes:
+    return _dumps(model.dict(by_alias=True))
+
+
+def _array_response(items: Iterable[bytes]) -> Response:
+    return Response(
+        content=b"[" + b",".join(items) + b"]",
+        media_type=ORJSONResponse.media_type,
+    )
+
+
+def vaccine_locations_response(
+    locations: Sequence[VaccineLocationExpandedResponse],
+) -> Response:
+    """
+    Serializes the locations of a nearby search. The locations, addresses
+    and organizations are spliced in from the fragment cache, so only the
+    vaccine availabilities are encoded on every request.
+    """
+    return _array_response(
+        _vaccine_location(location) for location in locations
+    )
+
+
+def vaccine_availabilities_response(
+    availabilities: Sequence[VaccineAvailabilityExpandedResponse],
+) -> Response:
+    """
+    Serializes the vaccine availabilities of a nearby search. Their locations
+    are spliced in from the fragment cache.
+    """
+    return _array_response(_vaccine_availability(a) for a in availabilities)
+
+
+def models_response(models: Sequence[BaseModel]) -> Response:
+    """
+    Serializes models that are already known to be valid, e.g. built from
+    database rows, the way FastAPI would for their `response_model`, but
+    without validating them against it again.
+    """
+    return _array_response(_model(model) for model in models)
+
+
+async def _iterate(items: Iterable[ModelType]) -> AsyncIterator[ModelType]:
+    for item in items:
+        yield item
+
+
+def stream_response(
+    models: AsyncIterable[ModelType],
+    media_type: str,
+    encode: Callable[[ModelType], bytes] = _model,
+) -> StreamingResponse:
+    """
+    Streams models as they are produced, either as newline-delimited JSON or
+    as a JSON array, depending on `media_type`.
+    """
+
+    async def ndjson() -> AsyncIterator[bytes]:
+        async for model in models:
+            yield encode(model) + b"\n"
+
+    async def array() -> AsyncIterator[bytes]:
+        separator = b"["
+        async for model in models:
+            yield separator + encode(model)
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+    body = ndjson() if media_type == NDJSON_MEDIA_TYPE else array()
+    return StreamingResponse(body, media_type=media_type)
+
+
+def stream_vaccine_locations_response(
+    locations: Sequence[VaccineLocationExpandedResponse], media_type: str
+) -> StreamingResponse:
+    return stream_response(_iterate(locations), media_type, _vaccine_location)
+
+
+def stream_vaccine_availabilities_response(
+    availabilities: Sequence[VaccineAvailabilityExpandedResponse],
+    media_type: str,
+) -> StreamingResponse:
+    return stream_response(
+        _iterate(availabilities), media_type, _vaccine_availability
+    )
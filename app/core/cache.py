@@ -0,0 +1,167 @@
+import time
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class _CacheEntry(Generic[ValueType]):
+    __slots__ = ("expires_at", "value", "tags")
+
+    def __init__(
+        self, expires_at: float, value: ValueType, tags: Tuple[str, ...]
+    ) -> None:
+        self.expires_at = expires_at
+        self.value = value
+        self.tags = tags
+
+
+class TTLCache(Generic[KeyType, ValueType]):
+    """
+    A bounded in-process cache with a time-to-live and least recently used
+    eviction. Entries can be tagged so that every entry sharing a tag can be
+    evicted at once. None of the operations await, so a cache can be shared
+    between coroutines on the same event loop without a lock.
+    A value loaded while its tags were invalidated may already be stale, so
+    it can be stored along with the `generation` read before loading it, and
+    isn't stored if one of its tags was invalidated since. The generations of
+    the last `max_size` tags invalidated are kept; an older generation is
+    refused whatever the tags.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None) -> None:
+        assert max_size > 0, "Cache size must be positive"
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[KeyType, _CacheEntry[ValueType]]"
+        self._entries = OrderedDict()
+        self._tags: Dict[str, Set[KeyType]] = {}
+        self.generation = 0
+        # Generation of the last invalidation of each tag, oldest first, and
+        # the latest generation of the tags that were forgotten since.
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._forgotten_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        """
+        Returns the value stored under `key`. None if there is no entry or the
+        entry has expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(
+        self,
+        key: KeyType,
+        value: ValueType,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Stores `value` under `key`, evicting the least recently used entry if
+        the cache is full.
+        :param generation: The generation of the cache before `value` was
+        loaded. The value isn't stored if one of its tags was invalidated
+        since.
+        """
+        entry_tags = tuple(set(tags))
+        if generation is not None and not self._is_current(
+            entry_tags, generation
+        ):
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = (
+            float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        )
+        self._entries[key] = _CacheEntry(expires_at, value, entry_tags)
+        for tag in entry_tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: KeyType) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Evicts every entry carrying at least one of `tags`. Returns the number
+        of entries evicted.
+        """
+        self.generation += 1
+        keys: Set[KeyType] = set()
+        for tag in tags:
+            keys.update(self._tags.get(tag, ()))
+            self._invalidated[tag] = self.generation
+            self._invalidated.move_to_end(tag)
+        while len(self._invalidated) > self.max_size:
+            _, self._forgotten_generation = self._invalidated.popitem(
+                last=False
+            )
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.generation += 1
+        self._invalidated.clear()
+        self._forgotten_generation = self.generation
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+    def _is_current(self, tags: Iterable[str], generation: int) -> bool:
+        if generation < self._forgotten_generation:
+            return False
+        return all(self._invalidated.get(tag, 0) <= generation for tag in tags)
+
+    def _remove(self, key: KeyType) -> None:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            tagged = self._tags.get(tag)
+            if tagged is None:
+                continue
+            tagged.discard(key)
+            if not tagged:
+                del self._tags[tag]
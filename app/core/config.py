@@ -1,4 +1,5 @@
-from typing import Optional
+import os
+from typing import Literal, Optional
 
 from pydantic import BaseSettings
 
@@ -19,6 +20,111 @@ class Settings(BaseSettings):
 
     # -- Database Connection ---
     DB_URL: str
+    # Bounds of the jittered delays between attempts to connect at startup.
+    DB_CONNECT_BACKOFF_INITIAL: float = 0.5
+    DB_CONNECT_BACKOFF_MAX: float = 30.0
+    # Seconds the readiness probe query may take.
+    DB_PROBE_TIMEOUT: float = 2.0
+    # Seconds to wait for a pooled connection to be free before giving up.
+    DB_POOL_ACQUIRE_TIMEOUT: float = 10.0
+    # Extra pooled connections a single request may borrow to run
+    # independent queries concurrently. 0 runs them one after another.
+    DB_FAN_OUT_MAX_CONNECTIONS: int = 2
+    # Compiled SQL statements and generated sproc batches kept per process.
+    DB_STATEMENT_CACHE_MAX_SIZE: int = 512
+    # Rows fetched at a time when a list is streamed.
+    DB_STREAM_BATCH_SIZE: int = 500
+
+    # -- Pagination ---
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 1000
+
+    # -- Search Cache ---
+    SEARCH_CACHE_TTL: float = 30.0
+    SEARCH_CACHE_MAX_SIZE: int = 1024
+    FRAGMENT_CACHE_MAX_SIZE: int = 8192
+
+    # -- Change Detection ---
+    # Fingerprints of the availabilities last reported per location, date
+    # and vaccine, so that reports that didn't change skip the database.
+    # They expire so that the database is written to once in a while anyway.
+    AVAILABILITY_FINGERPRINT_MAX_SIZE: int = 16384
+    AVAILABILITY_FINGERPRINT_TTL: float = 3600.0
+
+    # -- Write-Behind ---
+    # Buffer the reports of availabilities already reported, and only create
+    # the latest of those made within the window for each location, date
+    # and vaccine. Buffered reports are answered with 202 Accepted, so a
+    # report made with a key revoked since the last one accepted is only
+    # refused when it is flushed. The key's buffered reports are then
+    # dropped, and its reports are written right away until one is accepted.
+    AVAILABILITY_WRITE_BEHIND: bool = False
+    AVAILABILITY_WRITE_BEHIND_WINDOW: float = 2.0
+    AVAILABILITY_WRITE_BEHIND_BATCH_SIZE: int = 100
+    AVAILABILITY_WRITE_BEHIND_MAX_PENDING: int = 10000
+    # Keys refused while flushing, remembered so that their reports are
+    # written right away. One forgotten is refused again on its next flush.
+    AVAILABILITY_REFUSED_KEYS_MAX_SIZE: int = 1024
+    AVAILABILITY_REFUSED_KEYS_TTL: float = 3600.0
+
+    # -- Bulk Ingest ---
+    # Availabilities or timeslots a bulk request may carry, and the number
+    # of availabilities created in each transaction.
+    BULK_INGEST_MAX_ITEMS: int = 5000
+    BULK_INGEST_CHUNK_SIZE: int = 100
+    # Timeslots created per batch by a bulk request. Each takes three of the
+    # 2100 parameters SQL Server accepts per batch.
+    TIMESLOT_BATCH_SIZE: int = 500
+
+    # -- Idempotency ---
+    # Responses of the write requests made with an Idempotency-Key header,
+    # replayed when the same request is retried.
+    IDEMPOTENCY_CACHE_MAX_SIZE: int = 4096
+    IDEMPOTENCY_TTL: float = 86400.0
+    IDEMPOTENCY_KEY_MAX_LENGTH: int = 255
+
+    # -- Local Data ---
+    # Directory of the files kept across restarts.
+    DATA_DIR: str = os.path.expanduser("~/.vaxfinder")
+
+    # -- Web Push Delivery ---
+    # SQLite file recording the notifications left to send, relative to
+    # DATA_DIR unless absolute.
+    WEBPUSH_OUTBOX_PATH: str = "webpush_outbox.sqlite3"
+    # Tasks sending the notifications of new availabilities in the
+    # background, and the number of postal codes whose notification may wait
+    # for them.
+    WEBPUSH_WORKERS: int = 2
+    WEBPUSH_QUEUE_MAX_SIZE: int = 1000
+    # Seconds during which the subscribers of a forward sortation area are
+    # notified at most once, however many availabilities are reported there.
+    WEBPUSH_NOTIFY_WINDOW: float = 600.0
+    # Seconds the tasks wait between looking for notifications due again.
+    WEBPUSH_POLL_INTERVAL: float = 5.0
+    # Seconds a task has to send the notifications it claimed before they
+    # may be claimed again, e.g. after a restart.
+    WEBPUSH_CLAIM_TIMEOUT: float = 60.0
+    # Attempts to send a notification to a subscription, and the bounds of
+    # the jittered delays between them.
+    WEBPUSH_MAX_ATTEMPTS: int = 5
+    WEBPUSH_RETRY_BACKOFF_INITIAL: float = 30.0
+    WEBPUSH_RETRY_BACKOFF_MAX: float = 3600.0
+    # Subscriptions that no longer exist deleted per batch.
+    WEBPUSH_PRUNE_BATCH_SIZE: int = 100
+    # Push notifications being posted at once across every task.
+    WEBPUSH_MAX_CONCURRENT_DELIVERIES: int = 16
+    # Notifications claimed by a task at once, and encrypted per task of the
+    # encryption pool.
+    WEBPUSH_DELIVERY_BATCH_SIZE: int = 256
+    WEBPUSH_ENCRYPTION_BATCH_SIZE: int = 32
+    # Pool encrypting the notifications, "process" to use every core or
+    # "thread", and its size (the default size of the pool if None).
+    WEBPUSH_ENCRYPTION_EXECUTOR: Literal["process", "thread"] = "process"
+    WEBPUSH_ENCRYPTION_WORKERS: Optional[int] = None
+    # Seconds a push service may take to reply.
+    WEBPUSH_TIMEOUT: float = 10.0
+    # Seconds given to the notifications being sent to finish on shutdown.
+    WEBPUSH_SHUTDOWN_TIMEOUT: float = 5.0
 
     # -- Discord Connection ---
     # DISCORD_WEBHOOK_ADD: str
@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds of the buckets of latency histograms.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    Counts observed values in buckets of fixed upper bounds, along with their
+    number and sum. Observing doesn't await, so a histogram can be shared
+    between coroutines on the same event loop without a lock.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        assert list(buckets) == sorted(buckets), "Buckets must be sorted"
+        self.buckets = tuple(buckets)
+        self.count = 0
+        self.sum = 0.0
+        # The last count is of the values over the largest bound.
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        Returns the number of values at most each bound, followed by the total
+        number of values.
+        """
+        counts = []
+        total = 0
+        for count in self._counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the smallest bucket bound under which a fraction `q` of the
+        values fall. None if it is over the largest bound.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        for bound, count in zip(self.buckets, self.cumulative_counts()):
+            if count >= rank:
+                return bound
+        return None
+
+
+class HistogramFamily:
+    """
+    Histograms of one metric, one per combination of label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *labelvalues: str) -> Histogram:
+        histogram = self._histograms.get(labelvalues)
+        if histogram is None:
+            assert len(labelvalues) == len(self.labelnames), "Missing labels"
+            histogram = Histogram(self.buckets)
+            self._histograms[labelvalues] = histogram
+        return histogram
+
+    def render(self) -> List[str]:
+        return render_histograms(
+            self.name,
+            self.documentation,
+            self.labelnames,
+            self._histograms.items(),
+        )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labelnames: Sequence[str], labelvalues: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"'
+        for name, value in zip(labelnames, labelvalues)
+    )
+    return f"{{{pairs}}}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_samples(
+    name: str,
+    documentation: str,
+    metric_type: str,
+    labelnames: Sequence[str],
+    samples: Iterable[Tuple[Sequence[str], float]],
+) -> List[str]:
+    """
+    Renders the samples of a gauge or counter in the Prometheus text format.
+    :param samples: Pairs of label values and sample value.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labelvalues, value in samples:
+        lines.append(
+            f"{name}{_labels(labelnames, labelvalues)} {_number(value)}"
+        )
+    return lines
+
+
+def render_histograms(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str],
+    histograms: Iterable[Tuple[Sequence[str], Histogram]],
+) -> List[str]:
+    """
+    Renders histograms in the Prometheus text format.
+    :param histograms: Pairs of label values and histogram.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"]
+    bucket_labelnames = (*labelnames, "le")
+    for labelvalues, histogram in histograms:
+        bounds = (*histogram.buckets, float("inf"))
+        for bound, count in zip(bounds, histogram.cumulative_counts()):
+            bucket_labels = _labels(
+                bucket_labelnames, (*labelvalues, _number(bound))
+            )
+            lines.append(f"{name}_bucket{bucket_labels} {count}")
+        labels = _labels(labelnames, labelvalues)
+        lines.append(f"{name}_sum{labels} {_number(histogram.sum)}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+
+class PoolMetrics:
+    """
+    Usage of a connection pool: how long acquiring a connection waited for
+    one to be free, how long connections were held, and how many acquires
+    timed out.
+    """
+
+    def __init__(self) -> None:
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait = Histogram()
+        self.checkout_duration = Histogram()
+
+
+request_duration = HistogramFamily(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests by method, route and status code.",
+    ("method", "path", "status"),
+)
+
+sproc_duration = HistogramFamily(
+    "db_sproc_duration_seconds",
+    "Duration of stored procedure batches by procedure and return code.",
+    ("procname", "return_code"),
+)
@@ -0,0 +1,46 @@
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class SingleFlight(Generic[KeyType, ValueType]):
+    """
+    Coalesces concurrent calls that share a key. The first caller starts the
+    call and every caller that arrives while it is in flight awaits the same
+    result (or exception) instead of running it again. The call runs in its
+    own task, so that a caller being cancelled, the first one included,
+    doesn't cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: "Dict[KeyType, asyncio.Future[ValueType]]" = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def do(
+        self, key: KeyType, call: Callable[[], Awaitable[ValueType]]
+    ) -> ValueType:
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(future)
+
+    def _done(self, key: KeyType, future: "asyncio.Future[ValueType]") -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # Every caller may have been cancelled, which would otherwise log
+            # the exception when the future is garbage collected.
+            future.exception()
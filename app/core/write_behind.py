@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from loguru import logger
+
+from app.core.metrics import Histogram
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class WriteBehindBuffer(Generic[KeyType, ValueType]):
+    """
+    Holds writes in memory and keeps only the latest one per key, so that a
+    burst of writes to the same key is written once. A background task
+    flushes the writes in batches once the first write to their key has
+    waited `window` seconds. The writes of a batch that failed to be flushed
+    are flushed again after `window` seconds, unless they were superseded
+    since. Stopping the buffer flushes every pending write.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[ValueType]], Awaitable[None]],
+        window: float,
+        batch_size: int,
+        max_pending: int,
+    ) -> None:
+        assert batch_size > 0, "Batch size must be positive"
+        self.flush = flush
+        self.window = window
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.buffered = 0
+        # Writes that superseded a pending write to the same key.
+        self.coalesced = 0
+        # Writes refused because too many were pending.
+        self.rejected = 0
+        self.flushed = 0
+        self.flush_failures = 0
+        self.flush_duration = Histogram()
+        # When the first pending write to each key was buffered, and the
+        # latest one. Ordered by the former.
+        self._pending: "OrderedDict[KeyType, Tuple[float, ValueType]]"
+        self._pending = OrderedDict()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: KeyType) -> bool:
+        return key in self._pending
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def oldest_pending_seconds(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        queued_at, _ = next(iter(self._pending.values()))
+        return max(time.monotonic() - queued_at, 0.0)
+
+    def start(self) -> None:
+        assert not self.is_running, "Write-behind is already running"
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the background task, then flushes every pending write.
+        """
+        assert self._task is not None, "Write-behind is not running"
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wake = None
+        while self._pending:
+            if not await self._flush_batch(0.0):
+                logger.error(
+                    "Lost {} buffered write(s) at shutdown", len(self._pending)
+                )
+                self._pending.clear()
+
+    def put(self, key: KeyType, value: ValueType) -> bool:
+        """
+        Buffers a write, superseding the pending write to the same key.
+        :return: Whether the write was buffered. It has to be made right away
+        if not, which happens when the buffer isn't running or is full.
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._pending[key] = (pending[0], value)
+            self.coalesced += 1
+            return True
+        if not self.is_running or len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return False
+        self._pending[key] = (time.monotonic(), value)
+        self.buffered += 1
+        if len(self._pending) == 1:
+            assert self._wake is not None
+            self._wake.set()
+        return True
+
+    def discard(self, key: KeyType) -> None:
+        """
+        Drops the pending write to `key`, e.g. because it was written since.
+        """
+        self._pending.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[KeyType], bool]) -> int:
+        """
+        Drops the pending writes to the keys matching `predicate`, e.g.
+        because they can't be written anymore. Returns how many were dropped.
+        """
+        keys = [key for key in self._pending if predicate(key)]
+        for key in keys:
+            del self._pending[key]
+        return len(keys)
+
+    async def _run(self) -> None:
+        assert self._wake is not None, "Write-behind is not running"
+        wake = self._wake
+        while True:
+            wake.clear()
+            oldest = self.oldest_pending_seconds
+            if oldest is None:
+                await wake.wait()
+                continue
+            if oldest < self.window:
+                await asyncio.sleep(self.window - oldest)
+                continue
+            if not await self._flush_batch(self.window):
+                await asyncio.sleep(self.window)
+
+    async def _flush_batch(self, window: float) -> bool:
+        """
+        Flushes up to `batch_size` of the writes that waited `window` seconds.
+        :return: Whether the flush succeeded.
+        """
+        now = time.monotonic()
+        batch: List[Tuple[KeyType, float, ValueType]] = []
+        for key, (queued_at, value) in self._pending.items():
+            if len(batch) >= self.batch_size or now - queued_at < window:
+                break
+            batch.append((key, queued_at, value))
+        if not batch:
+            return True
+        for key, _, _ in batch:
+            del self._pending[key]
+
+        started_at = time.monotonic()
+        try:
+            await self.flush([value for _, _, value in batch])
+        except BaseException as e:
+            # The writes are kept to be flushed again, also when the flush
+            # was cancelled by stopping, unless they were superseded since.
+            for key, queued_at, value in reversed(batch):
+                if key not in self._pending:
+                    self._pending[key] = (queued_at, value)
+                    self._pending.move_to_end(key, last=False)
+            if not isinstance(e, Exception):
+                raise
+            self.flush_failures += 1
+            logger.exception(
+                "Failed to flush {} buffered write(s): {!r}", len(batch), e
+            )
+            return False
+        finally:
+            self.flush_duration.observe(time.monotonic() - started_at)
+        self.flushed += len(batch)
+        return True
@@ -1,5 +1,24 @@
+import asyncio
 import importlib
-from typing import Any, Dict, List, Optional, Tuple, Union
+import random
+import time
+from contextlib import asynccontextmanager
+from types import TracebackType
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
 import aioodbc
@@ -12,12 +31,81 @@ from databases.interfaces import (
     TransactionBackend,
 )
 from loguru import logger
-from sqlalchemy.engine.interfaces import Dialect, ExecutionContext
+from sqlalchemy.engine.interfaces import Compiled, Dialect, ExecutionContext
 from sqlalchemy.engine.result import ResultMetaData, RowProxy
 from sqlalchemy.sql import ClauseElement
 from sqlalchemy.sql.elements import TextClause
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import PoolMetrics, sproc_duration
+from app.db.rows import RowFactory, decode_row, decode_rows, dict_rows
+
+# Column name of the returned value of a sproc in a batch that has other
+# result sets.
+RETURN_VALUE_COLUMN = "__return_value"
+
+
+class CompilationContext:
+    def __init__(self, context: ExecutionContext):
+        self.context = context
+
+
+# Queries are compiled once per SQL text and sproc batches are generated once
+# per sproc and parameter names, since the set of statements run is small.
+compiled_statements: TTLCache[
+    str, Tuple[Compiled, CompilationContext]
+] = TTLCache(settings.DB_STATEMENT_CACHE_MAX_SIZE)
+
+sproc_batches: TTLCache[Tuple[Any, ...], str] = TTLCache(
+    settings.DB_STATEMENT_CACHE_MAX_SIZE
+)
+
+
+class _SprocTimer:
+    """
+    Records the duration of a sproc batch by sproc name and return code. The
+    return code is labelled as `positive` when it is an identifier, as
+    `mixed` when the executions of a batch returned different codes, and as
+    `other` when it isn't a return code (e.g. a selected UUID), so that the
+    labels stay few.
+    """
+
+    __slots__ = ("procname", "return_value", "_started_at")
+
+    def __init__(self, procname: str) -> None:
+        self.procname = procname
+        self.return_value: Any = None
+        self._started_at = 0.0
+
+    def __enter__(self) -> "_SprocTimer":
+        self._started_at = time.monotonic()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is not None:
+            return_code = "exception"
+        elif isinstance(self.return_value, int) and self.return_value > 0:
+            return_code = "positive"
+        elif self.return_value in (0, -1, "mixed"):
+            return_code = str(self.return_value)
+        else:
+            return_code = "other"
+        sproc_duration.labels(self.procname, return_code).observe(
+            time.monotonic() - self._started_at
+        )
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no pooled connection became free within
+    `DB_POOL_ACQUIRE_TIMEOUT`.
+    """
 
 
 class MSSQLBackend(DatabaseBackend):
@@ -52,6 +140,7 @@ class MSSQLBackend(DatabaseBackend):
             "autocommit", "false"
         ).lower() in ("true", "yes", "1", "y", "t")
         self._pool: Pool = None
+        self.metrics = PoolMetrics()
 
     def _get_connection_kwargs(self) -> Dict[str, Any]:
         url_options = self._database_url.options
@@ -98,29 +187,114 @@ class MSSQLBackend(DatabaseBackend):
         assert self._pool is not None, "DatabaseBackend is not running"
         self._pool.close()
         await self._pool.wait_closed()
+        self._pool = None
 
     @property
-    def connection(self) -> "MSSQLConnection":
-        return MSSQLConnection(self, self._dialect)
+    def is_connected(self) -> bool:
+        return self._pool is not None
+
+    async def connect_with_backoff(
+        self,
+        initial_delay: float,
+        max_delay: float,
+    ) -> int:
+        """
+        Connects to the database, retrying until it succeeds. The delay
+        before each retry grows exponentially from `initial_delay` up to
+        `max_delay`, with full jitter so that workers restarted together
+        don't retry in lockstep.
+        :param initial_delay: Upper bound of the first delay in seconds.
+        :param max_delay: Upper bound of every delay in seconds.
+        :return: The number of attempts made.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self.connect()
+                return attempt
+            except Exception as e:
+                delay = random.uniform(
+                    0, min(max_delay, initial_delay * 2 ** (attempt - 1))
+                )
+                logger.critical(e)
+                logger.critical(
+                    "Connecting to database again in {:.1f}s (attempt {})",
+                    delay,
+                    attempt,
+                )
+                await asyncio.sleep(delay)
 
+    async def probe(self) -> None:
+        """
+        Runs a trivial query on a pooled connection, raising if it fails.
+        """
+        connection = self.connection
+        await connection.acquire(autocommit=True)
+        try:
+            await connection.fetch_one("SELECT 1")
+        finally:
+            await connection.release()
 
-class CompilationContext:
-    def __init__(self, context: ExecutionContext):
-        self.context = context
+    @property
+    def connection(self) -> "MSSQLConnection":
+        return MSSQLConnection(self, self._dialect)
 
 
 class MSSQLConnection(ConnectionBackend):
-    def __init__(self, database: MSSQLBackend, dialect: Dialect):
+    def __init__(
+        self,
+        database: MSSQLBackend,
+        dialect: Dialect,
+        fan_out_limit: Optional[asyncio.Semaphore] = None,
+    ):
         self._database: MSSQLBackend = database
         self._dialect = dialect
         self._connection: Connection = None
+        self._acquired_at: Optional[float] = None
+        self._on_demand_autocommit: Optional[bool] = None
+        # Shared with the connections borrowed by `gather`, so nested fan-outs
+        # count against the same limit.
+        self._fan_out_limit = fan_out_limit
+
+    def acquire_on_demand(self, autocommit: bool = False) -> None:
+        """
+        Defers acquiring a connection from the pool until the first query is
+        made on this connection.
+        """
+        assert self._connection is None, "Connection is already acquired"
+        self._on_demand_autocommit = autocommit
+
+    @property
+    def is_acquired(self) -> bool:
+        return self._connection is not None
+
+    async def _ensure_acquired(self) -> None:
+        if self._connection is None and self._on_demand_autocommit is not None:
+            await self.acquire(self._on_demand_autocommit)
+        assert self._connection is not None, "Connection is not acquired"
 
     async def acquire(self, autocommit: bool = False) -> None:
         assert self._connection is None, "Connection is already acquired"
         assert (
             self._database.pool is not None
         ), "DatabaseBackend is not running"
-        self._connection = await self._database.pool.acquire()
+        metrics = self._database.metrics
+        metrics.acquires += 1
+        started_at = time.monotonic()
+        try:
+            self._connection = await asyncio.wait_for(
+                self._database.pool.acquire(),
+                settings.DB_POOL_ACQUIRE_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            metrics.acquire_timeouts += 1
+            raise PoolTimeoutError(
+                f"No pooled connection was free within "
+                f"{settings.DB_POOL_ACQUIRE_TIMEOUT}s"
+            ) from None
+        self._acquired_at = time.monotonic()
+        metrics.acquire_wait.observe(self._acquired_at - started_at)
         self._connection._conn.autocommit = autocommit
 
     async def release(self) -> None:
@@ -130,12 +304,100 @@ class MSSQLConnection(ConnectionBackend):
         ), "DatabaseBackend is not running"
         self._connection = await self._database.pool.release(self._connection)
         self._connection = None
+        if self._acquired_at is not None:
+            self._database.metrics.checkout_duration.observe(
+                time.monotonic() - self._acquired_at
+            )
+            self._acquired_at = None
+        self._on_demand_autocommit = None
+
+    async def gather(
+        self, *calls: Callable[["MSSQLConnection"], Awaitable[Any]]
+    ) -> List[Any]:
+        """
+        Run independent read-only calls concurrently and return their results
+        in order. The first call runs on this connection and the others on
+        connections borrowed from the pool, which are released as soon as
+        their call completes. At most `DB_FAN_OUT_MAX_CONNECTIONS` connections
+        are borrowed at once per request, including nested fan-outs, and only
+        while the pool has free connections, so that requests holding a
+        connection never wait on each other for more; the other calls run on
+        this connection after the first one.
+        :param calls: Callables that make their queries on the connection
+        they are given.
+        :return: The results of the calls.
+        """
+        if self._fan_out_limit is None:
+            self._fan_out_limit = asyncio.Semaphore(
+                max(settings.DB_FAN_OUT_MAX_CONNECTIONS, 0)
+            )
+        fan_out_limit = self._fan_out_limit
+
+        results: List[Any] = [None] * len(calls)
+        local: List[int] = []
+        borrowed: List[int] = []
+        free = self.free_connections()
+        for index in range(len(calls)):
+            if index == 0 or fan_out_limit.locked() or len(borrowed) >= free:
+                local.append(index)
+            else:
+                # Never suspends since the semaphore isn't locked, so calls
+                # never wait on each other for a connection.
+                await fan_out_limit.acquire()
+                borrowed.append(index)
+
+        async def call_local() -> None:
+            for index in local:
+                results[index] = await calls[index](self)
+
+        async def call_borrowed(index: int) -> None:
+            try:
+                async with self.borrow() as connection:
+                    results[index] = await calls[index](connection)
+            finally:
+                fan_out_limit.release()
+
+        await asyncio.gather(
+            call_local(), *(call_borrowed(index) for index in borrowed)
+        )
+        return results
+
+    def free_connections(self) -> int:
+        """
+        The number of pooled connections that can be borrowed without
+        waiting for another request to release one.
+        """
+        assert (
+            self._database.pool is not None
+        ), "DatabaseBackend is not running"
+        return int(self._database.pool.freesize)
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator["MSSQLConnection"]:
+        """
+        Acquires another connection from the pool in autocommit mode for the
+        duration of the context, e.g. to query while a cursor of this
+        connection is still being read, or in a task that may outlive the
+        request holding this connection. It shares the fan-out limit of this
+        connection. Waits for a free connection if there is none, so check
+        `free_connections` first where the request can do without.
+        """
+        connection = MSSQLConnection(
+            self._database, self._dialect, self._fan_out_limit
+        )
+        await connection.acquire(autocommit=True)
+        try:
+            yield connection
+        finally:
+            await connection.release()
 
     async def fetch_all(
-        self, query: Union[ClauseElement, str]
+        self,
+        query: Union[ClauseElement, str],
+        values: Optional[Dict[str, Any]] = None,
     ) -> List[RowProxy]:
-        assert self._connection is not None, "Connection is not acquired"
-        query, args, context = self._compile(query)
+        await self._ensure_acquired()
+        query, args, context = self._compile(query, values)
         async with self._connection.cursor() as cursor:
             if args:
                 await cursor.execute(query, *args)
@@ -151,7 +413,7 @@ class MSSQLConnection(ConnectionBackend):
             ]
 
     async def fetch_one(self, query: ClauseElement) -> Optional[RowProxy]:
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         query, args, context = self._compile(query)
         async with await self._connection.cursor() as cursor:
             if args:
@@ -166,8 +428,47 @@ class MSSQLConnection(ConnectionBackend):
                 metadata, row, metadata._processors, metadata._keymap
             )
 
+    async def iterate(
+        self,
+        query: Union[ClauseElement, str],
+        row_factory: RowFactory = dict_rows,
+        batch_size: Optional[int] = None,
+        values: Optional[Dict[str, Any]] = None,
+    ) -> AsyncGenerator[Any, None]:
+        """
+        Execute a query and yield its rows as they are fetched, instead of
+        fetching all of them first. No other query can be made on this
+        connection until the iteration completes.
+        :param query: The query to execute.
+        :param values: The values of the bind parameters of the query.
+        :param row_factory: Decodes each row, into a dictionary by default.
+        :param batch_size: The number of rows fetched at a time. Defaults to
+        `DB_STREAM_BATCH_SIZE`.
+        :return: An asynchronous generator of the decoded rows.
+        """
+        await self._ensure_acquired()
+        query, args, context = self._compile(query, values)
+        if batch_size is None:
+            batch_size = settings.DB_STREAM_BATCH_SIZE
+        async with await self._connection.cursor() as cursor:
+            if args:
+                await cursor.execute(query, *args)
+            else:
+                await cursor.execute(query)
+            decode = None
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if decode is None:
+                    decode = row_factory(
+                        [column[0] for column in cursor.description]
+                    )
+                for row in rows:
+                    yield decode(row)
+
     async def execute(self, query: ClauseElement) -> Any:
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         query, args, context = self._compile(query)
         async with await self._connection.cursor() as cursor:
             if args:
@@ -177,7 +478,7 @@ class MSSQLConnection(ConnectionBackend):
             return cursor.rowcount
 
     async def execute_many(self, queries: List[ClauseElement]) -> None:
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         async with await self._connection.cursor() as cursor:
             for single_query in queries:
                 single_query, args, context = self._compile(single_query)
@@ -187,20 +488,49 @@ class MSSQLConnection(ConnectionBackend):
                     await cursor.execute(single_query)
 
     @staticmethod
-    def _sproc_execute_parameters(
-        procname: str,
+    def _sproc_parameter_markers(
+        parameter_keys: Tuple[str, ...], has_auth: bool
+    ) -> str:
+        params_markers = [f"@{param_key}=?" for param_key in parameter_keys]
+        if has_auth:
+            params_markers.insert(0, "@auth=?")
+        return ",".join(params_markers)
+
+    @staticmethod
+    def _sproc_parameter_values(
         parameters: Dict[str, Any],
         auth_key: Optional[UUID] = None,
-    ) -> Tuple[str, List[Any]]:
-        params_markers = [f"@{param_key}=?" for param_key in parameters.keys()]
+    ) -> List[Any]:
         params_values = list(parameters.values())
         if auth_key is not None:
-            params_markers.insert(0, "@auth=?")
             params_values.insert(0, auth_key)
-        query = f"""DECLARE @rc int
-                EXEC @rc =  dbo.{procname} {','.join(params_markers)}
+        return params_values
+
+    @staticmethod
+    def _sproc_execute_parameters(
+        procname: str,
+        parameters: Dict[str, Any],
+        auth_key: Optional[UUID] = None,
+    ) -> Tuple[str, List[Any]]:
+        cache_key = (
+            "execute",
+            procname,
+            tuple(parameters),
+            auth_key is not None,
+        )
+        query = sproc_batches.get(cache_key)
+        if query is None:
+            params_markers = MSSQLConnection._sproc_parameter_markers(
+                cache_key[2], cache_key[3]
+            )
+            query = f"""DECLARE @rc int
+                EXEC @rc =  dbo.{procname} {params_markers}
                 SELECT @rc
             """
+            sproc_batches.set(cache_key, query)
+        params_values = MSSQLConnection._sproc_parameter_values(
+            parameters, auth_key
+        )
         logger.debug(
             "Stored procedure query prepared for execution.\nQuery with "
             "Parameters: {}\nParameter Values: {}",
@@ -223,53 +553,151 @@ class MSSQLConnection(ConnectionBackend):
         :param auth_key: An authentication key to execute the sproc.
         :return: The returned value from the stored procedure.
         """
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         query, params_values = self._sproc_execute_parameters(
             procname, parameters, auth_key
         )
-        async with await self._connection.cursor() as cursor:
-            await cursor.execute(query, params_values)
-            ret_value = await cursor.fetchone()
-            return ret_value[0]
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                ret_value = await cursor.fetchone()
+                timer.return_value = ret_value[0]
+        return timer.return_value
+
+    @staticmethod
+    def _sproc_execute_many_parameters(
+        procname: str,
+        parameter_sets: Sequence[Dict[str, Any]],
+        auth_key: Optional[UUID] = None,
+    ) -> Tuple[str, List[Any]]:
+        keys = tuple(parameter_sets[0])
+        assert all(
+            tuple(parameters) == keys for parameters in parameter_sets
+        ), "Every parameter set must have the same variables"
+        cache_key = (
+            "execute_many",
+            procname,
+            keys,
+            auth_key is not None,
+            len(parameter_sets),
+        )
+        query = sproc_batches.get(cache_key)
+        if query is None:
+            params_markers = MSSQLConnection._sproc_parameter_markers(
+                keys, auth_key is not None
+            )
+            execs = "\n".join(
+                f"""EXEC @rc =  dbo.{procname} {params_markers}
+                SELECT @rc AS {RETURN_VALUE_COLUMN}"""
+                for _ in parameter_sets
+            )
+            query = f"""DECLARE @rc int
+                {execs}
+            """
+            sproc_batches.set(cache_key, query)
+        params_values = [
+            value
+            for parameters in parameter_sets
+            for value in MSSQLConnection._sproc_parameter_values(
+                parameters, auth_key
+            )
+        ]
+        logger.debug(
+            "Stored procedure batch prepared for execution.\nQuery with "
+            "Parameters: {}\nParameter Values: {}",
+            query.split(),
+            params_values,
+        )
+        return query, params_values
+
+    async def execute_sproc_many(
+        self,
+        procname: str,
+        parameter_sets: Sequence[Dict[str, Any]],
+        auth_key: Optional[UUID] = None,
+    ) -> List[Any]:
+        """
+        Execute a stored procedure (sproc) once per parameter set, in a single
+        batch, i.e. in a single round trip. SQL Server accepts at most 2100
+        parameters per batch, so large sets should be split by the caller.
+        :param procname: The name of the sproc.
+        :param parameter_sets: Dictionaries with the same keys, where the keys
+        are the variables for the sproc and the values are the values to be
+        used during an execution.
+        :param auth_key: An authentication key to execute the sproc.
+        :return: The returned value of each execution, in order.
+        """
+        if not parameter_sets:
+            return []
+        await self._ensure_acquired()
+        query, params_values = self._sproc_execute_many_parameters(
+            procname, parameter_sets, auth_key
+        )
+
+        ret_values = []
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                while True:
+                    description = cursor.description
+                    if (
+                        description is not None
+                        and description[0][0] == RETURN_VALUE_COLUMN
+                    ):
+                        ret_values.append((await cursor.fetchone())[0])
+                    if not await cursor.nextset():
+                        break
+            distinct_values = set(ret_values)
+            timer.return_value = (
+                distinct_values.pop() if len(distinct_values) == 1 else "mixed"
+            )
+        return ret_values
 
     async def sproc_fetch(
         self,
         procname: str,
         parameters: Dict[str, Any],
         auth_key: Optional[UUID] = None,
-    ) -> Tuple[Any, List[Optional[List[Dict[str, Any]]]]]:
-        assert self._connection is not None, "Connection is not acquired"
+        row_factory: RowFactory = dict_rows,
+        max_rows: Optional[int] = None,
+    ) -> Tuple[Any, List[Optional[List[Mapping[str, Any]]]]]:
+        """
+        Execute a stored procedure (sproc), where several result sets are
+        returned.
+        :param max_rows: The number of rows read from the first result set at
+        most. The rest are discarded without being fetched.
+        :return: A tuple. The first value is the returned value from the stored
+        procedure. The second value is the rows of each result set.
+        """
+        await self._ensure_acquired()
         query, params_values = self._sproc_execute_parameters(
             procname, parameters, auth_key
         )
 
         sproc_unprocessed = []
-        async with await self._connection.cursor() as cursor:
-            if len(params_values) > 0:
-                await cursor.execute(query, params_values)
-            else:
-                await cursor.execute(query)
-            while True:
-                rows = await cursor.fetchall()
-                sproc_unprocessed.append((cursor.description, rows))
-                if not await cursor.nextset():
-                    break
-        ret_val = sproc_unprocessed.pop()[1][0][0]
-        sproc_processed: List[Optional[List[Dict[str, Any]]]] = []
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                if len(params_values) > 0:
+                    await cursor.execute(query, params_values)
+                else:
+                    await cursor.execute(query)
+                while True:
+                    if max_rows is None:
+                        rows = await cursor.fetchall()
+                    else:
+                        rows = await cursor.fetchmany(max_rows)
+                        max_rows = None
+                    sproc_unprocessed.append((cursor.description, rows))
+                    if not await cursor.nextset():
+                        break
+            ret_val = timer.return_value = sproc_unprocessed.pop()[1][0][0]
+        sproc_processed: List[Optional[List[Mapping[str, Any]]]] = []
         for (description, rows) in sproc_unprocessed:
             if rows is None:
                 sproc_processed.append(rows)
             else:
                 sproc_processed.append(
-                    [
-                        dict(
-                            zip(
-                                [column[0] for column in description],
-                                row,
-                            )
-                        )
-                        for row in rows
-                    ],
+                    decode_rows(description, rows, row_factory)
                 )
         return ret_val, sproc_processed
 
@@ -278,80 +706,294 @@ class MSSQLConnection(ConnectionBackend):
         procname: str,
         parameters: Dict[str, Any],
         auth_key: Optional[UUID] = None,
-    ) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        row_factory: RowFactory = dict_rows,
+    ) -> Tuple[Any, Optional[Mapping[str, Any]]]:
         """
         Execute a stored procedure (sproc), where one row is returned.
         :param procname: The name of the sproc.
         :param parameters: A dictionary, where the keys are the variables for
         the sproc and the values are the values to be used during execution.
         :param auth_key: An authentication key to execute the sproc.
+        :param row_factory: Decodes the row, into a dictionary by default.
         :return: A tuple. The first value is the returned value from the stored
         procedure. The second value is a dictionary of a row, where the keys
         are the column names and the corresponding values are the values. None
         if the execution didn't succeed.
         """
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         query, params_values = self._sproc_execute_parameters(
             procname, parameters, auth_key
         )
-        async with await self._connection.cursor() as cursor:
-            await cursor.execute(query, params_values)
-            row = await cursor.fetchone()
-            row_description = cursor.description
-            await cursor.nextset()
-            ret_value = await cursor.fetchone()
-            if row is None:
-                return ret_value[0], row
-            return ret_value[0], dict(
-                zip([column[0] for column in row_description], row)
-            )
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                row = await cursor.fetchone()
+                row_description = cursor.description
+                await cursor.nextset()
+                ret_value = await cursor.fetchone()
+                timer.return_value = ret_value[0]
+        return timer.return_value, decode_row(
+            row_description, row, row_factory
+        )
 
     async def sproc_fetch_all(
         self,
         procname: str,
         parameters: Dict[str, Any],
         auth_key: Optional[UUID] = None,
-    ) -> Tuple[Any, Optional[List[Dict[str, Any]]]]:
+        row_factory: RowFactory = dict_rows,
+    ) -> Tuple[Any, Optional[List[Mapping[str, Any]]]]:
         """
         Execute a stored procedure (sproc), where many rows are returned.
         :param procname: The name of the sproc.
         :param parameters: A dictionary, where the keys are the variables for
         the sproc and the values are the values to be used during execution.
         :param auth_key: An authentication key to execute the sproc.
+        :param row_factory: Decodes each row, into a dictionary by default.
         :return: A tuple. The first value is the returned value from the stored
         procedure. The second value is a list of rows with each row being a
         dictionary, where the keys are the column names and the corresponding
         values are the values. None if the execution didn't succeed.
         """
-        assert self._connection is not None, "Connection is not acquired"
+        await self._ensure_acquired()
         query, params_values = self._sproc_execute_parameters(
             procname, parameters, auth_key
         )
-        async with await self._connection.cursor() as cursor:
-            await cursor.execute(query, params_values)
-            rows = await cursor.fetchall()
-            rows_description = cursor.description
-            await cursor.nextset()
-            ret_value = await cursor.fetchone()
-            if rows is None:
-                return ret_value[0], rows
-            return ret_value[0], [
-                dict(zip([column[0] for column in rows_description], row))
-                for row in rows
-            ]
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                rows = await cursor.fetchall()
+                rows_description = cursor.description
+                await cursor.nextset()
+                ret_value = await cursor.fetchone()
+                timer.return_value = ret_value[0]
+        if rows is None:
+            return timer.return_value, rows
+        return timer.return_value, decode_rows(
+            rows_description, rows, row_factory
+        )
+
+    @staticmethod
+    def _sproc_execute_read_parameters(
+        procname: str,
+        parameters: Dict[str, Any],
+        read_procname: str,
+        read_parameter: str,
+        read_identifier: Optional[Union[UUID, int]],
+        read_first: bool,
+        auth_key: Optional[UUID] = None,
+    ) -> Tuple[str, List[Any]]:
+        assert (
+            not read_first or read_identifier is not None
+        ), "Missing identifier to read"
+        cache_key = (
+            "execute_read",
+            procname,
+            tuple(parameters),
+            auth_key is not None,
+            read_procname,
+            read_parameter,
+            read_identifier is None,
+            read_first,
+        )
+        query = sproc_batches.get(cache_key)
+        if query is None:
+            params_markers = MSSQLConnection._sproc_parameter_markers(
+                cache_key[2], cache_key[3]
+            )
+            # The row is read by the return value of the sproc when no
+            # identifier is given, e.g. the id of a created row.
+            read_query = (
+                f"EXEC dbo.{read_procname} "
+                f"@{read_parameter}={'@rc' if read_identifier is None else '?'}"
+            )
+            if read_first:
+                query = f"""DECLARE @rc int
+                {read_query}
+                EXEC @rc =  dbo.{procname} {params_markers}
+                SELECT @rc AS {RETURN_VALUE_COLUMN}
+            """
+            else:
+                query = f"""DECLARE @rc int
+                EXEC @rc =  dbo.{procname} {params_markers}
+                SELECT @rc AS {RETURN_VALUE_COLUMN}
+                IF @rc NOT IN (0, -1) {read_query}
+            """
+            sproc_batches.set(cache_key, query)
+        params_values = MSSQLConnection._sproc_parameter_values(
+            parameters, auth_key
+        )
+        if read_first:
+            params_values.insert(0, read_identifier)
+        elif read_identifier is not None:
+            params_values.append(read_identifier)
+        logger.debug(
+            "Stored procedure query prepared for execution.\nQuery with "
+            "Parameters: {}\nParameter Values: {}",
+            query.split(),
+            params_values,
+        )
+        return query, params_values
+
+    async def sproc_execute_read(
+        self,
+        procname: str,
+        parameters: Dict[str, Any],
+        read_procname: str,
+        read_parameter: str,
+        read_identifier: Optional[Union[UUID, int]] = None,
+        read_first: bool = False,
+        auth_key: Optional[UUID] = None,
+        row_factory: RowFactory = dict_rows,
+    ) -> Tuple[Any, Optional[Mapping[str, Any]]]:
+        """
+        Execute a stored procedure (sproc) and read the affected row with
+        another sproc in the same batch, i.e. in a single round trip.
+        :param procname: The name of the sproc.
+        :param parameters: A dictionary, where the keys are the variables for
+        the sproc and the values are the values to be used during execution.
+        :param read_procname: The name of the sproc reading the row.
+        :param read_parameter: The identifier variable of the read sproc.
+        :param read_identifier: The identifier of the row to read. The
+        returned value from the first sproc is used if None.
+        :param read_first: Whether the row is read before executing the sproc
+        (e.g. before a deletion) instead of after it. The row is only read
+        after the sproc if its returned value isn't 0 or -1.
+        :param auth_key: An authentication key to execute the sproc.
+        :param row_factory: Decodes the read row, into a dictionary by
+        default.
+        :return: A tuple. The first value is the returned value from the
+        stored procedure. The second value is a dictionary of the read row,
+        where the keys are the column names and the corresponding values are
+        the values. None if no row was read.
+        """
+        await self._ensure_acquired()
+        query, params_values = self._sproc_execute_read_parameters(
+            procname,
+            parameters,
+            read_procname,
+            read_parameter,
+            read_identifier,
+            read_first,
+            auth_key,
+        )
+
+        result_sets = []
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                while True:
+                    if cursor.description is not None:
+                        rows = await cursor.fetchall()
+                        result_sets.append((cursor.description, rows))
+                    if not await cursor.nextset():
+                        break
+
+            ret_index = next(
+                index
+                for index, (description, _) in enumerate(result_sets)
+                if description[0][0] == RETURN_VALUE_COLUMN
+            )
+            ret_value = timer.return_value = result_sets[ret_index][1][0][0]
+        read_sets = (
+            result_sets[:ret_index]
+            if read_first
+            else result_sets[ret_index + 1 :]
+        )
+        if not read_sets or not read_sets[0][1]:
+            return ret_value, None
+        row_description, rows = read_sets[0]
+        return ret_value, decode_row(row_description, rows[0], row_factory)
+
+    async def execute_sproc_select_many(
+        self,
+        procname: str,
+        parameter_sets: Sequence[Dict[str, Any]],
+        auth_key: Optional[UUID] = None,
+    ) -> List[Tuple[Any, Any]]:
+        """
+        Execute a stored procedure (sproc) once per parameter set, in a single
+        batch, i.e. in a single round trip, keeping the first value each
+        execution selects, e.g. the id of a created row. SQL Server accepts at
+        most 2100 parameters per batch, so large sets should be split by the
+        caller.
+        :param procname: The name of the sproc.
+        :param parameter_sets: Dictionaries with the same keys, where the keys
+        are the variables for the sproc and the values are the values to be
+        used during an execution.
+        :param auth_key: An authentication key to execute the sproc.
+        :return: A tuple per execution, in order. The first value is the
+        returned value from the stored procedure. The second value is the
+        first value it selected, which is its returned value if it selected
+        nothing, as with `execute_sproc`.
+        """
+        if not parameter_sets:
+            return []
+        await self._ensure_acquired()
+        query, params_values = self._sproc_execute_many_parameters(
+            procname, parameter_sets, auth_key
+        )
+
+        results: List[Tuple[Any, Any]] = []
+        selected: List[Any] = []
+        with _SprocTimer(procname) as timer:
+            async with await self._connection.cursor() as cursor:
+                await cursor.execute(query, params_values)
+                while True:
+                    description = cursor.description
+                    if description is None:
+                        pass
+                    elif description[0][0] == RETURN_VALUE_COLUMN:
+                        ret_value = (await cursor.fetchone())[0]
+                        results.append(
+                            (ret_value, selected[0] if selected else ret_value)
+                        )
+                        selected = []
+                    else:
+                        # Selected by the execution before its returned value
+                        row = await cursor.fetchone()
+                        if row is not None:
+                            selected.append(row[0])
+                    if not await cursor.nextset():
+                        break
+            distinct_values = set(ret_value for ret_value, _ in results)
+            timer.return_value = (
+                distinct_values.pop() if len(distinct_values) == 1 else "mixed"
+            )
+        return results
 
     def transaction(self) -> "MSSQLTransaction":
         return MSSQLTransaction(self)
 
     def _compile(
-        self, query: str
+        self, query: str, values: Optional[Dict[str, Any]] = None
     ) -> Tuple[str, List[Any], CompilationContext]:
-        sql_query: TextClause = sqlalchemy.text(query)
-        compiled = sql_query.compile(dialect=self._dialect)
-        args: Dict[str, Any] = compiled.construct_params()
+        cached = compiled_statements.get(query)
+        if cached is None:
+            cached = self._compile_uncached(query)
+            compiled_statements.set(query, cached)
+        compiled, context = cached
+        args_values = self._bind(compiled, values) if compiled.binds else []
+        logger.debug(f"Query: {compiled.string}\nArgs: {args_values}")
+        return compiled.string, args_values, context
+
+    @staticmethod
+    def _bind(
+        compiled: Compiled, values: Optional[Dict[str, Any]]
+    ) -> List[Any]:
+        args: Dict[str, Any] = compiled.construct_params(values)
         for key, val in args.items():
             if key in compiled._bind_processors:
                 args[key] = compiled._bind_processors[key](val)
+        if compiled.positional:
+            return [args[key] for key in compiled.positiontup]
+        return list(args.values())
+
+    def _compile_uncached(
+        self, query: str
+    ) -> Tuple[Compiled, CompilationContext]:
+        sql_query: TextClause = sqlalchemy.text(query)
+        compiled = sql_query.compile(dialect=self._dialect)
 
         execution_context = self._dialect.execution_ctx_cls()
         execution_context.dialect = self._dialect
@@ -361,13 +1003,7 @@ class MSSQLConnection(ConnectionBackend):
             compiled._textual_ordered_columns,
         )
 
-        args_values = list(args.values())
-        logger.debug(f"Query: {compiled.string}\nArgs: {args_values}")
-        return (
-            compiled.string,
-            args_values,
-            CompilationContext(execution_context),
-        )
+        return compiled, CompilationContext(execution_context)
 
     @property
     def raw_connection(self) -> Connection:
@@ -376,31 +1012,32 @@ class MSSQLConnection(ConnectionBackend):
 
 
 class MSSQLTransaction(TransactionBackend):
+    """
+    An explicit transaction on a connection. It is begun and ended with T-SQL
+    statements, so it works whether or not the connection is in autocommit
+    mode, and ending it does nothing if a stored procedure already rolled it
+    back.
+    """
+
     def __init__(self, connection: MSSQLConnection):
         self._connection: MSSQLConnection = connection
-        self._original_autocommit = self._connection.raw_connection.autocommit
+
+    async def _execute(self, statement: str) -> None:
+        await self._connection._ensure_acquired()
+        raw_connection = self._connection.raw_connection
+        async with await raw_connection.cursor() as cursor:
+            await cursor.execute(statement)
 
     async def start(
         self, is_root: bool, extra_options: Dict[Any, Any]
     ) -> None:
-        assert (
-            self._connection.raw_connection is not None
-        ), "Connection is not acquired"
-        self._connection.raw_connection.autocommit = False
+        await self._execute("BEGIN TRANSACTION")
 
     async def commit(self) -> None:
-        assert (
-            self._connection.raw_connection is not None
-        ), "Connection is not acquired"
-        self._connection.raw_connection.commit()
-        self._connection.raw_connection.autocommit = self._original_autocommit
+        await self._execute("IF @@TRANCOUNT > 0 COMMIT TRANSACTION")
 
     async def rollback(self) -> None:
-        assert (
-            self._connection.raw_connection is not None
-        ), "Connection is not acquired"
-        self._connection.raw_connection.rollback()
-        self._connection.raw_connection.autocommit = self._original_autocommit
+        await self._execute("IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION")
 
 
 db = MSSQLBackend(settings.DB_URL)
@@ -0,0 +1,85 @@
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# Builds the decoder of the rows of a result set from its column names, so the
+# column names are only looked at once per result set rather than per row.
+RowFactory = Callable[[Sequence[str]], Callable[[Sequence[Any]], Any]]
+
+
+class Record(Mapping[str, Any]):
+    """
+    A read-only row backed by the tuple of its values. The column index is
+    shared by every record of a result set. Values can be accessed by column
+    name, either as keys or as attributes.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: Sequence[Any]) -> None:
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self)!r})"
+
+
+def dict_rows(columns: Sequence[str]) -> Callable[[Sequence[Any]], Any]:
+    keys = tuple(columns)
+    return lambda row: dict(zip(keys, row))
+
+
+def record_rows(columns: Sequence[str]) -> Callable[[Sequence[Any]], Any]:
+    index = {column: position for position, column in enumerate(columns)}
+    return partial(Record, index)
+
+
+def decode_rows(
+    description: Sequence[Tuple[Any, ...]],
+    rows: List[Sequence[Any]],
+    row_factory: RowFactory = dict_rows,
+) -> List[Mapping[str, Any]]:
+    """
+    Decodes the rows of a result set with `row_factory`, given the cursor
+    description of the result set.
+    """
+    decode = row_factory([column[0] for column in description])
+    return [decode(row) for row in rows]
+
+
+def decode_row(
+    description: Sequence[Tuple[Any, ...]],
+    row: Optional[Sequence[Any]],
+    row_factory: RowFactory = dict_rows,
+) -> Optional[Mapping[str, Any]]:
+    if row is None:
+        return None
+    decode = row_factory([column[0] for column in description])
+    decoded: Mapping[str, Any] = decode(row)
+    return decoded
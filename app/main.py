@@ -1,16 +1,22 @@
+import asyncio
 import time
 from typing import List
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from loguru import logger
 
 from app import logging_config
+from app.api import health, idempotency, metrics
 from app.api.api_v1.api import api_router
 from app.api.openapi_tags import openapi_tags
+from app.api.pagination import NEXT_CURSOR_HEADER
 from app.core.config import settings
-from app.db.database import MSSQLBackend, db
+from app.db.database import PoolTimeoutError, db
+from app.services.push_delivery import push_deliveries
+from app.services.vaccine_availability import availability_writes
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -24,6 +30,10 @@ app = FastAPI(
 
 fastapi_logger = logging_config.make_logger()
 
+# --- Idempotency ---
+# Added first so that the replayed responses get the CORS headers.
+app.add_middleware(idempotency.IdempotencyMiddleware)
+
 # --- Cross-Origin Resource Sharing ---
 origins = ["*"]
 app.add_middleware(
@@ -32,32 +42,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# --- Metrics ---
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
 # --- Database Startup Procedure ---
 @app.on_event("startup")
 async def startup() -> None:
-    while True:
-        try:
-            # check health
-            await db.connect()
-            logger.info("Database connection established")
-            break
-        except Exception as e:
-            logger.critical(e)
-            logger.critical("Connecting to database...")
-            time.sleep(5)
+    # Connecting is left running in the background so the worker can answer
+    # the health probes, and refuse requests needing the database, until the
+    # connection is established.
+    app.state.started_at = time.monotonic()
+    app.state.db_connect = asyncio.ensure_future(connect_db())
+    await push_deliveries.start()
+    if settings.AVAILABILITY_WRITE_BEHIND:
+        availability_writes.start()
+
+
+async def connect_db() -> None:
+    attempts = await db.connect_with_backoff(
+        settings.DB_CONNECT_BACKOFF_INITIAL, settings.DB_CONNECT_BACKOFF_MAX
+    )
+    logger.info(
+        "Database connection established in {:.2f}s after {} attempt(s)",
+        time.monotonic() - app.state.started_at,
+        attempts,
+    )
 
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
-    await db.disconnect()
+    # The buffered reports are created first, which may notify subscribers.
+    if availability_writes.is_running:
+        await availability_writes.stop()
+    await push_deliveries.stop(settings.WEBPUSH_SHUTDOWN_TIMEOUT)
+    app.state.db_connect.cancel()
+    if db.is_connected:
+        await db.disconnect()
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(
+    request: Request, exc: PoolTimeoutError
+) -> JSONResponse:
+    # The pool is saturated, so the client should retry later
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The database is busy, try again later."},
+    )
 
 
 # --- Routes ---
 app.include_router(
     api_router, prefix=settings.API_V1_STR, include_in_schema=True
 )
+app.include_router(health.router, prefix="/health", tags=["Health"])
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", port=8007, log_level="info", reload=True)
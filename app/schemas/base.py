@@ -1,14 +1,35 @@
 from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Mapping, Type, TypeVar
+from uuid import UUID
 
 from humps import camelize
 from pydantic import BaseModel as PydanticBaseModel
 from pydantic import validator
+from pydantic.fields import SHAPE_SINGLETON
+
+ModelType = TypeVar("ModelType", bound="BaseModel")
 
 
 def to_camel(convert_str: str) -> str:
     return str(camelize(convert_str))
 
 
+def _datetime_to_utc(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _str_to_uuid(value: Any) -> Any:
+    if isinstance(value, str):
+        return UUID(value)
+    return value
+
+
+# Normalisers applied by `BaseModel.from_row`, by model.
+_normalisers_by_model: Dict[type, Dict[str, Callable[[Any], Any]]] = {}
+
+
 class BaseModel(PydanticBaseModel):
     class Config:
         alias_generator = to_camel
@@ -20,3 +41,42 @@ class BaseModel(PydanticBaseModel):
         if dt is not None and isinstance(dt, datetime):
             dt = dt.replace(tzinfo=timezone.utc)
         return dt
+
+    @classmethod
+    def _row_normalisers(cls) -> Dict[str, Callable[[Any], Any]]:
+        normalisers = _normalisers_by_model.get(cls)
+        if normalisers is None:
+            normalisers = {}
+            for name, field in cls.__fields__.items():
+                if field.shape != SHAPE_SINGLETON:
+                    continue
+                if field.type_ is datetime:
+                    normalisers[name] = _datetime_to_utc
+                elif field.type_ is UUID:
+                    normalisers[name] = _str_to_uuid
+            _normalisers_by_model[cls] = normalisers
+        return normalisers
+
+    @classmethod
+    def from_row(
+        cls: Type[ModelType], row: Mapping[str, Any], **values: Any
+    ) -> ModelType:
+        """
+        Builds an instance from a row read from the database without
+        validating it, since the database already enforces the types. Only
+        the datetimes are set to UTC and the UUIDs parsed, as the validators
+        would. `values` take precedence over the row, e.g. for nested
+        instances that were already built.
+        """
+        normalisers = cls._row_normalisers()
+        fields: Dict[str, Any] = {}
+        for name, field in cls.__fields__.items():
+            if name in values:
+                fields[name] = values[name]
+            elif name in row:
+                value = row[name]
+                normalise = normalisers.get(name)
+                fields[name] = value if normalise is None else normalise(value)
+            else:
+                fields[name] = field.get_default()
+        return cls.construct(**fields)
@@ -0,0 +1,10 @@
+from typing import Optional
+
+from app.schemas.base import BaseModel
+
+
+class HealthResponse(BaseModel):
+    status: str
+    detail: Optional[str]
+    # Seconds from the start of the worker until it was first found ready.
+    startup_seconds: Optional[float]
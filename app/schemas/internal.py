@@ -0,0 +1,76 @@
+from typing import Optional
+
+from app.schemas.base import BaseModel
+
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    size: int
+    max_size: int
+
+
+class SingleFlightStatsResponse(BaseModel):
+    calls: int
+    coalesced: int
+    in_flight: int
+
+
+class HistogramStatsResponse(BaseModel):
+    count: int
+    sum: float
+    mean: float
+    # Bucket bounds under which the share of values fall, None when over
+    # the largest bound.
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
+
+
+class PoolStatsResponse(BaseModel):
+    connected: bool
+    min_size: int
+    max_size: int
+    size: int
+    free: int
+    in_use: int
+    acquires: int
+    acquire_timeouts: int
+    acquire_wait_seconds: HistogramStatsResponse
+    checkout_seconds: HistogramStatsResponse
+
+
+class PushDeliveryStatsResponse(BaseModel):
+    enqueued: int
+    # Coalesced into the notification of their area within the window
+    suppressed: int
+    dropped: int
+    sent: int
+    # Attempts that failed, including the ones retried since
+    failed: int
+    given_up: int
+    # Subscriptions found to no longer exist, and the ones deleted since
+    gone: int
+    pruned: int
+    pending_notifications: int
+    pending_deliveries: int
+    max_pending_notifications: int
+    oldest_pending_seconds: Optional[float]
+    delivery_lag_seconds: HistogramStatsResponse
+
+
+class WriteBehindStatsResponse(BaseModel):
+    enabled: bool
+    buffered: int
+    # Superseded the report buffered for the same availability
+    coalesced: int
+    # Created right away because too many reports were buffered
+    rejected: int
+    flushed: int
+    flush_failures: int
+    pending: int
+    max_pending: int
+    oldest_pending_seconds: Optional[float]
+    flush_seconds: HistogramStatsResponse
@@ -232,6 +232,18 @@ class VaccineAvailabilityExpandedCreateResponse(VaccineAvailabilityResponse):
     response_code: int
 
 
+class VaccineAvailabilityExpandedBulkCreateRequest(
+    VaccineAvailabilityExpandedCreateRequest
+):
+    external_key: str
+
+
+class VaccineAvailabilityExpandedBulkCreateResponse(BaseModel):
+    external_key: str
+    response_code: int
+    availability: Optional[VaccineAvailabilityResponse]
+
+
 class VaccineAvailabilityUpdateRequest(VaccineAvailabilityResponseBase):
     location: NonNegativeInt
     date: datetime
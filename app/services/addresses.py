@@ -1,10 +1,12 @@
-from typing import Type
+from typing import Optional, Type, Union
+from uuid import UUID
 
 from app.schemas.addresses import (
     AddressCreateRequest,
     AddressResponse,
     AddressUpdateRequest,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 
 
@@ -34,3 +36,13 @@ class AddressService(
     @property
     def update_response_schema(self) -> Type[AddressUpdateRequest]:
         return AddressUpdateRequest
+
+    async def _invalidate_cached(
+        self, identifier: Union[UUID, int], db_obj: Optional[AddressResponse]
+    ) -> None:
+        tags = [search_cache.address_tag(identifier)]
+        if db_obj is not None:
+            # The address may have moved its locations into the searches of
+            # its FSA
+            tags.append(search_cache.fsa_tag(db_obj.postcode))
+        search_cache.invalidate(tags)
@@ -1,14 +1,28 @@
 from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 from uuid import UUID
 
 from loguru import logger
 from pydantic import BaseModel
 
 from app.db.database import MSSQLConnection
+from app.db.rows import record_rows
 from app.services.exceptions import (
     InternalDatabaseError,
     InvalidAuthenticationKeyForRequest,
+    ObjectNotFoundError,
 )
 
 DBResponseSchemaType = TypeVar("DBResponseSchemaType", bound=BaseModel)
@@ -31,6 +45,17 @@ class BaseService(
     update_procedure_id_parameter: Optional[str] = None
     delete_procedure_name: Optional[str] = None
     delete_procedure_id_parameter: Optional[str] = None
+    # Whether create, update and delete read the affected instance in the
+    # same batch as their sproc (one round trip) instead of separately.
+    batch_writes: bool = True
+    # Whether the create sproc returns the id of the created instance as its
+    # return code, which only holds for integer ids. Otherwise the id is the
+    # first value the sproc selects, and the instance is read back
+    # separately.
+    create_returns_id: bool = True
+    # Upper bound on the ids in the `IN` list of a single `get_multi_by_ids`
+    # query.
+    max_ids_per_query: int = 1000
 
     @property
     @abstractmethod
@@ -55,12 +80,21 @@ class BaseService(
     def __init__(self, db: MSSQLConnection):
         self._db: MSSQLConnection = db
 
-    async def get(
-        self, identifier: Union[UUID, int], auth_key: Optional[UUID] = None
-    ) -> Optional[DBResponseSchemaType]:
+    async def _invalidate_cached(
+        self,
+        identifier: Union[UUID, int],
+        db_obj: Optional[DBResponseSchemaType],
+    ) -> None:
         """
-        Retrieve an instance from `self.table` from the database by id. None if
-        the object can't be found.
+        Called after a successful create, update or delete of an instance of
+        `self.table` so that cached reads containing it can be evicted.
+        `db_obj` is the instance as written, or as it was before a delete.
+        Nothing is cached by default.
+        """
+
+    def _read_procedure(self) -> Tuple[str, str]:
+        """
+        Returns the name of the read sproc and its id parameter.
         """
 
         procedure_name = (
@@ -75,6 +109,18 @@ class BaseService(
             else self.read_procedure_id_parameter
         )
 
+        return procedure_name, procedure_id_param
+
+    async def get(
+        self, identifier: Union[UUID, int], auth_key: Optional[UUID] = None
+    ) -> Optional[DBResponseSchemaType]:
+        """
+        Retrieve an instance from `self.table` from the database by id. None if
+        the object can't be found.
+        """
+
+        procedure_name, procedure_id_param = self._read_procedure()
+
         ret_value, db_obj = await self._db.sproc_fetch_one(
             procedure_name, {procedure_id_param: identifier}, auth_key=auth_key
         )
@@ -90,20 +136,88 @@ class BaseService(
         return self.db_response_schema(**db_obj)
 
     async def get_multi(
-        self,
+        self, limit: Optional[int] = None, after: Optional[int] = None
     ) -> List[DBResponseSchemaType]:
         """
-        List all instances from `self.table` from the database.
+        List the instances from `self.table` from the database, ordered by
+        id. Only the instances after the id `after` are listed, at most
+        `limit` of them, so that the table can be read page by page.
         """
 
-        db_rows = await self._db.fetch_all(
-            f"""
-            SELECT {','.join(list(self.db_response_schema.__fields__.keys()))}
+        query, values = self._select_multi_query(limit, after)
+        db_rows = await self._db.fetch_all(query, values)
+
+        return [self.db_response_schema(**r) for r in db_rows]
+
+    async def iterate_multi(
+        self, after: Optional[int] = None
+    ) -> AsyncIterator[DBResponseSchemaType]:
+        """
+        Iterate over the instances from `self.table` from the database after
+        the id `after`, ordered by id, as they are fetched without holding all
+        of them in memory.
+        """
+        query, values = self._select_multi_query(None, after)
+        async for row in self._db.iterate(
+            query, row_factory=record_rows, values=values
+        ):
+            yield self.db_response_schema(**row)
+
+    def _select_multi_query(
+        self, limit: Optional[int], after: Optional[int]
+    ) -> Tuple[str, Dict[str, Any]]:
+        values: Dict[str, Any] = {}
+        top = ""
+        if limit is not None:
+            top = "TOP (:limit) "
+            values["limit"] = limit
+        where = ""
+        if after is not None:
+            where = "WHERE id > :after"
+            values["after"] = after
+        query = f"""
+            SELECT {top}{','.join(list(self.db_response_schema.__fields__.keys()))}
             FROM dbo.{self.table}
+            {where}
+            ORDER BY id
             """
-        )
+        return query, values
 
-        return [self.db_response_schema(**r) for r in db_rows]
+    async def get_multi_by_ids(
+        self, identifiers: Iterable[int]
+    ) -> List[DBResponseSchemaType]:
+        """
+        List the instances from `self.table` with the given integer ids. The
+        ids are fetched in batches of `max_ids_per_query` per query instead of
+        one query per id.
+        """
+
+        ids = sorted({int(identifier) for identifier in identifiers})
+        db_objs: List[DBResponseSchemaType] = []
+
+        for start in range(0, len(ids), self.max_ids_per_query):
+            batch = ids[start : start + self.max_ids_per_query]
+            # The batch is padded with its last id to a power of two, so that
+            # a few statements are compiled and cached per table rather than
+            # one per batch size.
+            size = min(
+                1 << (len(batch) - 1).bit_length(), self.max_ids_per_query
+            )
+            values = {
+                f"id{index}": batch[min(index, len(batch) - 1)]
+                for index in range(size)
+            }
+            db_rows = await self._db.fetch_all(
+                f"""
+                SELECT {','.join(list(self.db_response_schema.__fields__.keys()))}
+                FROM dbo.{self.table}
+                WHERE id IN ({','.join(f':{key}' for key in values)})
+                """,
+                values,
+            )
+            db_objs.extend(self.db_response_schema(**r) for r in db_rows)
+
+        return db_objs
 
     async def create(
         self, params: CreateSchemaType, auth_key: UUID
@@ -118,21 +232,35 @@ class BaseService(
             else self.create_procedure_name
         )
 
-        ret_value = await self._db.execute_sproc(
-            procedure_name, params.dict(), auth_key
-        )
-
-        if ret_value == 0:
-            raise InvalidAuthenticationKeyForRequest()
-        elif ret_value == -1:
-            raise InternalDatabaseError(f"Failed to execute {procedure_name}")
-
-        # ret_value should be the identifier for the created object
-        created = await self.get(ret_value)
+        created: Optional[DBResponseSchemaType]
+        if self.batch_writes and self.create_returns_id:
+            # ret_value should be the identifier for the created object, which
+            # is read in the same batch
+            read_procedure_name, read_id_param = self._read_procedure()
+            ret_value, db_obj = await self._db.sproc_execute_read(
+                procedure_name,
+                params.dict(),
+                read_procedure_name,
+                read_id_param,
+                auth_key=auth_key,
+            )
+            self._check_write_return_value(procedure_name, ret_value)
+            created = (
+                None if db_obj is None else self.db_response_schema(**db_obj)
+            )
+        else:
+            ret_value = await self._db.execute_sproc(
+                procedure_name, params.dict(), auth_key
+            )
+            self._check_write_return_value(procedure_name, ret_value)
+            # ret_value should be the identifier for the created object
+            created = await self.get(ret_value)
 
         if created is None:
             raise InternalDatabaseError()
 
+        await self._invalidate_cached(ret_value, created)
+
         return created
 
     async def update(
@@ -160,19 +288,33 @@ class BaseService(
         parameters = params.dict(exclude={"id"})
         parameters[procedure_id_param] = identifier
 
-        ret_value = await self._db.execute_sproc(
-            procedure_name, parameters, auth_key
-        )
-
-        if ret_value == 0:
-            raise InvalidAuthenticationKeyForRequest()
-        elif ret_value == -1:
-            raise InternalDatabaseError(f"Failed to execute {procedure_name}")
-
-        updated = await self.get(identifier)
+        updated: Optional[DBResponseSchemaType]
+        if self.batch_writes:
+            read_procedure_name, read_id_param = self._read_procedure()
+            ret_value, db_obj = await self._db.sproc_execute_read(
+                procedure_name,
+                parameters,
+                read_procedure_name,
+                read_id_param,
+                read_identifier=identifier,
+                auth_key=auth_key,
+            )
+            self._check_write_return_value(procedure_name, ret_value)
+            updated = (
+                None if db_obj is None else self.db_response_schema(**db_obj)
+            )
+        else:
+            ret_value = await self._db.execute_sproc(
+                procedure_name, parameters, auth_key
+            )
+            self._check_write_return_value(procedure_name, ret_value)
+            updated = await self.get(identifier)
 
         if updated is None:
-            raise InternalDatabaseError()
+            # The sproc succeeded but there is no such instance
+            raise ObjectNotFoundError()
+
+        await self._invalidate_cached(identifier, updated)
 
         return updated
 
@@ -195,11 +337,42 @@ class BaseService(
             else self.delete_procedure_id_parameter
         )
 
-        ret_value: int = await self._db.execute_sproc(
-            procedure_name, {procedure_id_param: identifier}, auth_key=auth_key
-        )
-
+        deleted: Optional[DBResponseSchemaType]
+        if self.batch_writes:
+            # The instance is read right before it is deleted, in the same
+            # batch, to know whether it existed
+            read_procedure_name, read_id_param = self._read_procedure()
+            ret_value, db_obj = await self._db.sproc_execute_read(
+                procedure_name,
+                {procedure_id_param: identifier},
+                read_procedure_name,
+                read_id_param,
+                read_identifier=identifier,
+                read_first=True,
+                auth_key=auth_key,
+            )
+            if db_obj is None:
+                raise ObjectNotFoundError()
+            self._check_write_return_value(procedure_name, ret_value)
+            deleted = self.db_response_schema(**db_obj)
+        else:
+            deleted = await self.get(identifier)
+            if deleted is not None:
+                ret_value = await self._db.execute_sproc(
+                    procedure_name,
+                    {procedure_id_param: identifier},
+                    auth_key=auth_key,
+                )
+                self._check_write_return_value(procedure_name, ret_value)
+
+        if deleted is None:
+            raise ObjectNotFoundError()
+
+        await self._invalidate_cached(identifier, deleted)
+
+    @staticmethod
+    def _check_write_return_value(procedure_name: str, ret_value: int) -> None:
         if ret_value == 0:
             raise InvalidAuthenticationKeyForRequest()
         elif ret_value == -1:
-            raise InternalDatabaseError()
+            raise InternalDatabaseError(f"Failed to execute {procedure_name}")
@@ -20,3 +20,7 @@ class InternalDatabaseError(BaseServiceException):
 
 class DatabaseNotInSyncError(BaseServiceException):
     message = "Database is not in sync."
+
+
+class ObjectNotFoundError(BaseServiceException):
+    message = "Object not found."
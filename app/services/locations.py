@@ -1,7 +1,22 @@
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
-from app.schemas.addresses import AddressCreateRequest, AddressResponseBase
+from app.core.config import settings
+from app.db.database import MSSQLConnection
+from app.schemas.addresses import (
+    AddressCreateRequest,
+    AddressResponse,
+    AddressResponseBase,
+)
 from app.schemas.locations import (
     LocationCreateRequest,
     LocationCreateRequestExpanded,
@@ -9,9 +24,14 @@ from app.schemas.locations import (
     LocationResponse,
     LocationUpdateRequest,
 )
+from app.schemas.organizations import OrganizationResponse
+from app.services import search_cache
 from app.services.addresses import AddressService
 from app.services.base import BaseService
-from app.services.exceptions import InternalDatabaseError
+from app.services.exceptions import (
+    DatabaseNotInSyncError,
+    InternalDatabaseError,
+)
 from app.services.organizations import OrganizationService
 
 
@@ -42,24 +62,45 @@ class LocationService(
     def update_response_schema(self) -> Type[LocationUpdateRequest]:
         return LocationUpdateRequest
 
+    async def _invalidate_cached(
+        self, identifier: Union[UUID, int], db_obj: Optional[LocationResponse]
+    ) -> None:
+        tags = [search_cache.location_tag(identifier)]
+        if db_obj is not None and db_obj.postcode:
+            # The location may have moved into the searches of its FSA
+            tags.append(search_cache.fsa_tag(db_obj.postcode))
+        search_cache.invalidate(tags)
+
     async def _expand(
         self, location: LocationResponse
     ) -> LocationExpandedResponse:
-        address = None
-        if location.address is not None:
-            address = await AddressService(self._db).get(location.address)
+        async def get_address(
+            db: MSSQLConnection,
+        ) -> Optional[AddressResponse]:
+            if location.address is None:
+                return None
+            address = await AddressService(db).get(location.address)
             assert (
                 address is not None
             ), f"Could not find address {location.address} for location {location.id}"
-
-        organization = None
-        if location.organization is not None:
-            organization = await OrganizationService(self._db).get(
+            return address
+
+        async def get_organization(
+            db: MSSQLConnection,
+        ) -> Optional[OrganizationResponse]:
+            if location.organization is None:
+                return None
+            organization = await OrganizationService(db).get(
                 location.organization
             )
             assert (
                 organization is not None
             ), f"Could not find organization {location.organization} for location {location.id}"
+            return organization
+
+        address, organization = await self._db.gather(
+            get_address, get_organization
+        )
 
         location_expanded = location.dict()
         location_expanded.update(
@@ -100,29 +141,52 @@ class LocationService(
         location = LocationResponse(**location_rows[0])
         return await self._expand(location=location)
 
-    async def get_multi_expanded(self) -> List[LocationExpandedResponse]:
-        locations = await super().get_multi()
+    async def _expand_multi(
+        self, locations: List[LocationResponse]
+    ) -> List[LocationExpandedResponse]:
+        """
+        Expands many locations at once. Their addresses and organizations are
+        fetched in batches and joined in memory instead of being read one
+        location at a time.
+        """
+        addresses, organizations = await self._db.gather(
+            lambda db: AddressService(db).get_multi_by_ids(
+                location.address
+                for location in locations
+                if location.address is not None
+            ),
+            lambda db: OrganizationService(db).get_multi_by_ids(
+                location.organization
+                for location in locations
+                if location.organization is not None
+            ),
+        )
+
+        # convert to hash tables
+        address_hash = {a.id: a for a in addresses}
+        organization_hash = {o.id: o for o in organizations}
 
-        # TODO: should be done all at once instead of in a for loop
         locations_expanded: List[LocationExpandedResponse] = []
 
         for location in locations:
             address = None
             if location.address is not None:
-                address = await AddressService(self._db).get(location.address)
-                assert (
-                    address is not None
-                ), f"Could not find address {location.address} for location {location.id}"
+                try:
+                    address = address_hash[location.address]
+                except KeyError:
+                    raise DatabaseNotInSyncError(
+                        f"address `{location.address}` does not exist"
+                    )
 
             organization = None
             if location.organization is not None:
-                organization = await OrganizationService(self._db).get(
-                    location.organization
-                )
-                assert organization is not None, (
-                    f"Could not find organization {location.organization} for "
-                    f"location {location.id}"
-                )
+                try:
+                    organization = organization_hash[location.organization]
+                except KeyError:
+                    raise DatabaseNotInSyncError(
+                        f"organization `{location.organization}` does not "
+                        "exist"
+                    )
 
             location_expanded = location.dict()
             location_expanded.update(
@@ -135,6 +199,49 @@ class LocationService(
 
         return locations_expanded
 
+    async def get_multi_expanded(
+        self, limit: Optional[int] = None, after: Optional[int] = None
+    ) -> List[LocationExpandedResponse]:
+        locations = await super().get_multi(limit, after)
+        return await self._expand_multi(locations)
+
+    async def iterate_multi_expanded(
+        self, after: Optional[int] = None
+    ) -> AsyncIterator[LocationExpandedResponse]:
+        """
+        Iterate over all the locations expanded, as they are fetched. They
+        are expanded in batches of `DB_STREAM_BATCH_SIZE` on another
+        connection, since this one is busy reading the locations. If the
+        pool has no free connection, they are all read first and then
+        expanded on this one instead.
+        """
+        if not self._db.free_connections():
+            locations = [
+                location async for location in self.iterate_multi(after)
+            ]
+            for start in range(
+                0, len(locations), settings.DB_STREAM_BATCH_SIZE
+            ):
+                for expanded in await self._expand_multi(
+                    locations[start : start + settings.DB_STREAM_BATCH_SIZE]
+                ):
+                    yield expanded
+            return
+
+        async with self._db.borrow() as db:
+            batch: List[LocationResponse] = []
+            async for location in self.iterate_multi(after):
+                batch.append(location)
+                if len(batch) >= settings.DB_STREAM_BATCH_SIZE:
+                    for expanded in await LocationService(db)._expand_multi(
+                        batch
+                    ):
+                        yield expanded
+                    batch = []
+            if batch:
+                for expanded in await LocationService(db)._expand_multi(batch):
+                    yield expanded
+
     async def get_multi_expanded_org(
         self, organizationID: int
     ) -> List[LocationExpandedResponse]:
@@ -147,17 +254,16 @@ class LocationService(
         )
 
         location_rows = sproc_processed[0]
-        locations: List[LocationExpandedResponse] = []
 
         if location_rows is None or location_rows[0] is None:
             raise InternalDatabaseError(f"Failed to execute {procedure_name}")
 
-        for location_row in location_rows:
-            locations.append(
-                await self._expand(location=LocationResponse(**location_row))
-            )
-
-        return locations
+        return await self._expand_multi(
+            [
+                LocationResponse(**location_row)
+                for location_row in location_rows
+            ]
+        )
 
     async def create_expanded(
         self, location: LocationCreateRequestExpanded, auth_key: Optional[UUID]
@@ -196,4 +302,11 @@ class LocationService(
             "locations_Create", location_Params, auth_key
         )
 
+        search_cache.invalidate(
+            [
+                search_cache.location_tag(ret_val2),
+                search_cache.fsa_tag(location.postcode),
+            ]
+        )
+
         return ret_val2
@@ -1,10 +1,12 @@
-from typing import Type
+from typing import Optional, Type, Union
+from uuid import UUID
 
 from app.schemas.organizations import (
     OrganizationCreateRequest,
     OrganizationResponse,
     OrganizationUpdateRequest,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 
 
@@ -38,3 +40,10 @@ class OrganizationService(
     @property
     def update_response_schema(self) -> Type[OrganizationUpdateRequest]:
         return OrganizationUpdateRequest
+
+    async def _invalidate_cached(
+        self,
+        identifier: Union[UUID, int],
+        db_obj: Optional[OrganizationResponse],
+    ) -> None:
+        search_cache.invalidate([search_cache.organization_tag(identifier)])
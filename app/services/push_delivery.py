@@ -0,0 +1,398 @@
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
+
+import aiohttp
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.db.database import db
+from app.services.push_outbox import (
+    NotificationOutcome,
+    PendingDelivery,
+    PendingNotification,
+    PushOutbox,
+)
+from app.services.search_cache import fsa
+from app.services.webPush import (
+    EncryptedNotification,
+    WebPushService,
+    encrypt_notifications,
+    is_subscription_gone,
+    post_notification,
+)
+
+ResultType = TypeVar("ResultType")
+
+# Upper bounds in seconds of the buckets of the delivery lag histogram.
+DELIVERY_LAG_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class PushDispatcher:
+    """
+    Sends the push notifications of new availabilities in the background so
+    that the requests reporting them don't wait on the push services.
+    Notifications are recorded in a durable outbox and drained by a fixed
+    number of worker tasks, so the ones that weren't sent survive restarts.
+    A delivery that fails is retried with an exponential backoff until it
+    has been attempted `max_attempts` times, unless the push service replied
+    that its subscription no longer exists, in which case the subscription is
+    pruned along with the others found since.
+    Encrypting the notifications is CPU bound, so they are encrypted in
+    batches in a process or thread pool (`WEBPUSH_ENCRYPTION_EXECUTOR`)
+    rather than on the event loop. They are then posted with at most
+    `max_concurrent_deliveries` being posted at once, over a session that
+    reuses the connections to each push service.
+    """
+
+    def __init__(
+        self,
+        outbox: PushOutbox,
+        workers: int,
+        max_size: int,
+        max_concurrent_deliveries: int,
+        max_attempts: int,
+    ) -> None:
+        assert workers > 0, "At least one worker is needed"
+        assert max_concurrent_deliveries > 0, "Concurrency must be positive"
+        assert max_attempts > 0, "At least one attempt is needed"
+        self.outbox = outbox
+        self.workers = workers
+        self.max_size = max_size
+        self.max_concurrent_deliveries = max_concurrent_deliveries
+        self.max_attempts = max_attempts
+        self.enqueued = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.given_up = 0
+        # Subscriptions found to no longer exist, and the ones pruned since.
+        self.gone = 0
+        self.pruned = 0
+        # Seconds from the notification being recorded to it being sent.
+        self.delivery_lag = Histogram(DELIVERY_LAG_BUCKETS)
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._encryption_executor: Optional[Executor] = None
+        # The outbox is only used from its own thread.
+        self._outbox_executor: Optional[ThreadPoolExecutor] = None
+        self._deliveries: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._outbox_executor is not None
+
+    async def start(self) -> None:
+        assert not self.is_running, "Push delivery is already running"
+        self._outbox_executor = ThreadPoolExecutor(
+            1, thread_name_prefix="webpush-outbox"
+        )
+        await self._in_outbox(self.outbox.open)
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._deliveries = asyncio.Semaphore(self.max_concurrent_deliveries)
+        self._encryption_executor = _encryption_executor()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_concurrent_deliveries
+            ),
+            timeout=aiohttp.ClientTimeout(total=settings.WEBPUSH_TIMEOUT),
+        )
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Waits up to `timeout` seconds for the notifications being sent, then
+        stops the workers. The ones left are sent after the next start.
+        """
+        assert self.is_running, "Push delivery is not running"
+        assert self._wake is not None
+        self._stopping = True
+        self._wake.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._encryption_executor is not None:
+            self._encryption_executor.shutdown(wait=False)
+        if self._session is not None:
+            await self._session.close()
+        await self._in_outbox(self.outbox.close)
+        assert self._outbox_executor is not None
+        self._outbox_executor.shutdown(wait=True)
+        self._tasks = []
+        self._encryption_executor = None
+        self._outbox_executor = None
+        self._session = None
+
+    async def enqueue(
+        self, postal_code: str, location: Optional[int]
+    ) -> NotificationOutcome:
+        """
+        Records the notification of the subscribers of `postal_code` without
+        waiting for it to be sent. Notifications of an area within
+        `WEBPUSH_NOTIFY_WINDOW` seconds of the last one are suppressed.
+        """
+        if not self.is_running:
+            outcome = NotificationOutcome.dropped
+        else:
+            outcome = await self._in_outbox(
+                self.outbox.add_notification,
+                postal_code,
+                fsa(postal_code),
+                location,
+                time.time(),
+                self.max_size,
+                settings.WEBPUSH_NOTIFY_WINDOW,
+            )
+
+        if outcome is NotificationOutcome.queued:
+            self.enqueued += 1
+            assert self._wake is not None
+            self._wake.set()
+        elif outcome is NotificationOutcome.suppressed:
+            self.suppressed += 1
+        else:
+            self.dropped += 1
+            logger.warning(
+                "Dropped push notification of {} for location {}",
+                postal_code,
+                location,
+            )
+        return outcome
+
+    async def pending(self) -> Tuple[int, int, Optional[float]]:
+        """
+        Returns the number of pending notifications and deliveries, and the
+        age in seconds of the oldest of them.
+        """
+        if not self.is_running:
+            return 0, 0, None
+        notifications, deliveries, oldest = await self._in_outbox(
+            self.outbox.pending
+        )
+        return (
+            notifications,
+            deliveries,
+            None if oldest is None else max(time.time() - oldest, 0.0),
+        )
+
+    async def _in_outbox(
+        self, call: Callable[..., ResultType], *args: Any
+    ) -> ResultType:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._outbox_executor, partial(call, *args)
+        )
+
+    async def _work(self) -> None:
+        assert self._wake is not None, "Push delivery is not running"
+        wake = self._wake
+        while not self._stopping:
+            wake.clear()
+            try:
+                worked = await self._dispatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(
+                    "Failed to dispatch push notifications: {!r}", e
+                )
+                worked = False
+            if not worked and not self._stopping:
+                try:
+                    await asyncio.wait_for(
+                        wake.wait(), settings.WEBPUSH_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _dispatch(self) -> bool:
+        """
+        Fans out a pending notification, or sends the deliveries that are
+        due.
+        :return: Whether there was anything to do.
+        """
+        if db.is_connected:
+            notification = await self._in_outbox(
+                self.outbox.claim_notification,
+                time.time(),
+                settings.WEBPUSH_CLAIM_TIMEOUT,
+            )
+            if notification is not None:
+                await self._fan_out(notification)
+                return True
+
+        deliveries = await self._in_outbox(
+            self.outbox.claim_deliveries,
+            settings.WEBPUSH_DELIVERY_BATCH_SIZE,
+            time.time(),
+            settings.WEBPUSH_CLAIM_TIMEOUT,
+        )
+        batch_size = settings.WEBPUSH_ENCRYPTION_BATCH_SIZE
+        await asyncio.gather(
+            *(
+                self._deliver_batch(deliveries[start : start + batch_size])
+                for start in range(0, len(deliveries), batch_size)
+            )
+        )
+        if db.is_connected:
+            await self._prune()
+        return len(deliveries) > 0
+
+    async def _fan_out(self, notification: PendingNotification) -> None:
+        connection = db.connection
+        await connection.acquire(autocommit=True)
+        try:
+            subscriptions = await WebPushService(connection).ReadByPostal(
+                notification.postal_code
+            )
+        finally:
+            await connection.release()
+
+        await self._in_outbox(
+            self.outbox.fan_out, notification.id, subscriptions, time.time()
+        )
+
+    async def _prune(self) -> None:
+        """
+        Deletes a batch of the subscriptions found to no longer exist. They
+        are only removed from the outbox once deleted, so that a batch that
+        failed to be deleted is claimed again.
+        """
+        endpoints = await self._in_outbox(
+            self.outbox.claim_gone_endpoints,
+            settings.WEBPUSH_PRUNE_BATCH_SIZE,
+            time.time(),
+            settings.WEBPUSH_CLAIM_TIMEOUT,
+        )
+        if not endpoints:
+            return
+        connection = db.connection
+        await connection.acquire(autocommit=True)
+        try:
+            pruned = await WebPushService(connection).DeleteWebhooks(endpoints)
+        finally:
+            await connection.release()
+        await self._in_outbox(self.outbox.remove_gone_endpoints, endpoints)
+        self.pruned += pruned
+        logger.info(
+            "Pruned {} of {} push subscription(s) that no longer exist",
+            pruned,
+            len(endpoints),
+        )
+
+    async def _deliver_batch(self, deliveries: List[PendingDelivery]) -> None:
+        """
+        Encrypts a batch of notifications in the encryption pool, then posts
+        each of them as soon as the batch is encrypted.
+        """
+        loop = asyncio.get_event_loop()
+        encrypted = await loop.run_in_executor(
+            self._encryption_executor,
+            encrypt_notifications,
+            [delivery.subscription for delivery in deliveries],
+        )
+        await asyncio.gather(
+            *(
+                self._deliver(delivery, notification)
+                for delivery, notification in zip(deliveries, encrypted)
+            )
+        )
+
+    async def _deliver(
+        self,
+        delivery: PendingDelivery,
+        notification: Union[EncryptedNotification, Exception],
+    ) -> None:
+        assert self._deliveries is not None, "Push delivery is not running"
+        assert self._session is not None, "Push delivery is not running"
+        try:
+            if isinstance(notification, Exception):
+                raise notification
+            async with self._deliveries:
+                await post_notification(notification, self._session)
+        except Exception as e:
+            self.failed += 1
+            if is_subscription_gone(e):
+                self.gone += 1
+                await self._in_outbox(
+                    self.outbox.remove_gone_delivery,
+                    delivery.id,
+                    delivery.subscription.endpoint,
+                    time.time(),
+                )
+            else:
+                await self._retry(delivery, e)
+        else:
+            self.sent += 1
+            self.delivery_lag.observe(time.time() - delivery.created_at)
+            await self._in_outbox(self.outbox.remove_delivery, delivery.id)
+
+    async def _retry(
+        self, delivery: PendingDelivery, error: Exception
+    ) -> None:
+        attempts = delivery.attempts + 1
+        if attempts >= self.max_attempts:
+            self.given_up += 1
+            logger.warning(
+                "Giving up on push notification to {} after {} attempts: {!r}",
+                delivery.subscription.endpoint,
+                attempts,
+                error,
+            )
+            await self._in_outbox(self.outbox.remove_delivery, delivery.id)
+            return
+
+        # Half of the delay is jittered so that the deliveries that failed
+        # together aren't retried together.
+        delay = min(
+            settings.WEBPUSH_RETRY_BACKOFF_MAX,
+            settings.WEBPUSH_RETRY_BACKOFF_INITIAL * 2 ** (attempts - 1),
+        )
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        logger.info(
+            "Retrying push notification to {} in {:.0f}s (attempt {}): {!r}",
+            delivery.subscription.endpoint,
+            delay,
+            attempts,
+            error,
+        )
+        await self._in_outbox(
+            self.outbox.retry_delivery,
+            delivery.id,
+            time.time() + delay,
+            repr(error),
+        )
+
+
+def _encryption_executor() -> Executor:
+    if settings.WEBPUSH_ENCRYPTION_EXECUTOR == "process":
+        return ProcessPoolExecutor(settings.WEBPUSH_ENCRYPTION_WORKERS)
+    return ThreadPoolExecutor(
+        settings.WEBPUSH_ENCRYPTION_WORKERS,
+        thread_name_prefix="webpush-encryption",
+    )
+
+
+push_deliveries = PushDispatcher(
+    PushOutbox(os.path.join(settings.DATA_DIR, settings.WEBPUSH_OUTBOX_PATH)),
+    settings.WEBPUSH_WORKERS,
+    settings.WEBPUSH_QUEUE_MAX_SIZE,
+    settings.WEBPUSH_MAX_CONCURRENT_DELIVERIES,
+    settings.WEBPUSH_MAX_ATTEMPTS,
+)
@@ -0,0 +1,347 @@
+import os
+import sqlite3
+from enum import Enum
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from app.schemas.webPush import SubscriptionBase
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification (
+    id INTEGER PRIMARY KEY,
+    postal_code TEXT NOT NULL,
+    fsa TEXT NOT NULL UNIQUE,
+    location INTEGER,
+    created_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS delivery (
+    id INTEGER PRIMARY KEY,
+    endpoint TEXT NOT NULL UNIQUE,
+    auth TEXT NOT NULL,
+    p256dh TEXT NOT NULL,
+    postal_code TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS delivery_next_attempt_at
+    ON delivery (next_attempt_at);
+CREATE TABLE IF NOT EXISTS fsa_window (
+    fsa TEXT PRIMARY KEY,
+    notified_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gone_endpoint (
+    endpoint TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class NotificationOutcome(Enum):
+    queued = "queued"
+    # The area was notified recently or its notification is still pending
+    suppressed = "suppressed"
+    # Too many notifications are pending
+    dropped = "dropped"
+
+
+class PendingNotification(NamedTuple):
+    id: int
+    postal_code: str
+    location: Optional[int]
+
+
+class PendingDelivery(NamedTuple):
+    id: int
+    subscription: SubscriptionBase
+    created_at: float
+    attempts: int
+
+
+class PushOutbox:
+    """
+    The push notifications left to send, kept in a SQLite file so that they
+    survive restarts. A notification of a postal code is fanned out into one
+    delivery per subscription. There is at most one pending notification per
+    forward sortation area (FSA) and one pending delivery per endpoint, so that repeated
+    reports don't flood subscribers. Rows are claimed for `lock_seconds`
+    before being processed so that processes sharing the file don't process
+    them twice, and rows claimed by a process that stopped are processed
+    again once their claim expires.
+    The methods block on the file, so they should be run from a single
+    thread outside of the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        assert self._connection is None, "Outbox is already open"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._connection = connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        assert self._connection is not None, "Outbox is not open"
+        return self._connection
+
+    def add_notification(
+        self,
+        postal_code: str,
+        fsa: str,
+        location: Optional[int],
+        now: float,
+        max_pending: int,
+        window: float,
+    ) -> NotificationOutcome:
+        """
+        Records the notification of the subscribers of `postal_code`, unless
+        its forward sortation area (FSA) was notified less than `window`
+        seconds ago, so that bursts of reports for an area notify its
+        subscribers once.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "DELETE FROM fsa_window WHERE notified_at <= ?",
+                (now - window,),
+            )
+            if db.execute(
+                "SELECT 1 FROM fsa_window WHERE fsa = ?", (fsa,)
+            ).fetchone():
+                return NotificationOutcome.suppressed
+            (pending,) = db.execute(
+                "SELECT COUNT(*) FROM notification"
+            ).fetchone()
+            if pending >= max_pending:
+                return NotificationOutcome.dropped
+            inserted = db.execute(
+                """
+                INSERT OR IGNORE INTO notification
+                    (postal_code, fsa, location, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (postal_code, fsa, location, now),
+            ).rowcount
+            db.execute(
+                "INSERT INTO fsa_window (fsa, notified_at) VALUES (?, ?)",
+                (fsa, now),
+            )
+        if not inserted:
+            return NotificationOutcome.suppressed
+        return NotificationOutcome.queued
+
+    def claim_notification(
+        self, now: float, lock_seconds: float
+    ) -> Optional[PendingNotification]:
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                """
+                SELECT id, postal_code, location FROM notification
+                WHERE locked_until <= ?
+                ORDER BY id
+                LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE notification SET locked_until = ? WHERE id = ?",
+                (now + lock_seconds, row[0]),
+            )
+        return PendingNotification(*row)
+
+    def fan_out(
+        self,
+        notification_id: int,
+        subscriptions: Iterable[SubscriptionBase],
+        now: float,
+    ) -> None:
+        """
+        Replaces a notification by the deliveries to its subscriptions,
+        skipping the endpoints that already have one pending.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                """
+                INSERT OR IGNORE INTO delivery (
+                    endpoint, auth, p256dh, postal_code, created_at,
+                    next_attempt_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        subscription.endpoint,
+                        subscription.auth,
+                        subscription.p256dh,
+                        subscription.postalCode,
+                        now,
+                        now,
+                    )
+                    for subscription in subscriptions
+                ),
+            )
+            db.execute(
+                "DELETE FROM notification WHERE id = ?", (notification_id,)
+            )
+
+    def claim_deliveries(
+        self, limit: int, now: float, lock_seconds: float
+    ) -> List[PendingDelivery]:
+        """
+        Claims up to `limit` deliveries due at `now`, oldest first.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                """
+                SELECT id, endpoint, auth, p256dh, postal_code, created_at,
+                    attempts
+                FROM delivery
+                WHERE next_attempt_at <= ? AND locked_until <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+                """,
+                (now, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE delivery SET locked_until = ? WHERE id = ?",
+                ((now + lock_seconds, row[0]) for row in rows),
+            )
+        return [
+            PendingDelivery(
+                id=row[0],
+                subscription=SubscriptionBase.construct(
+                    endpoint=row[1],
+                    auth=row[2],
+                    p256dh=row[3],
+                    postalCode=row[4],
+                ),
+                created_at=row[5],
+                attempts=row[6],
+            )
+            for row in rows
+        ]
+
+    def remove_delivery(self, delivery_id: int) -> None:
+        """
+        Removes a delivery that was sent or won't be attempted again.
+        """
+        with self._db as db:
+            db.execute("DELETE FROM delivery WHERE id = ?", (delivery_id,))
+
+    def remove_gone_delivery(
+        self, delivery_id: int, endpoint: str, now: float
+    ) -> None:
+        """
+        Removes a delivery whose subscription no longer exists, recording its
+        endpoint so that the subscription is pruned.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM delivery WHERE id = ?", (delivery_id,))
+            db.execute(
+                """
+                INSERT OR IGNORE INTO gone_endpoint (endpoint, created_at)
+                VALUES (?, ?)
+                """,
+                (endpoint, now),
+            )
+
+    def claim_gone_endpoints(
+        self, limit: int, now: float, lock_seconds: float
+    ) -> List[str]:
+        """
+        Claims up to `limit` endpoints of subscriptions to prune, oldest
+        first.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            endpoints = [
+                endpoint
+                for (endpoint,) in db.execute(
+                    """
+                    SELECT endpoint FROM gone_endpoint
+                    WHERE locked_until <= ?
+                    ORDER BY created_at
+                    LIMIT ?
+                    """,
+                    (now, limit),
+                )
+            ]
+            db.executemany(
+                "UPDATE gone_endpoint SET locked_until = ? WHERE endpoint = ?",
+                ((now + lock_seconds, endpoint) for endpoint in endpoints),
+            )
+        return endpoints
+
+    def remove_gone_endpoints(self, endpoints: List[str]) -> None:
+        """
+        Removes the endpoints of subscriptions that were pruned.
+        """
+        with self._db as db:
+            db.executemany(
+                "DELETE FROM gone_endpoint WHERE endpoint = ?",
+                ((endpoint,) for endpoint in endpoints),
+            )
+
+    def retry_delivery(
+        self, delivery_id: int, next_attempt_at: float, error: str
+    ) -> None:
+        with self._db as db:
+            db.execute(
+                """
+                UPDATE delivery
+                SET attempts = attempts + 1, next_attempt_at = ?,
+                    locked_until = 0, last_error = ?
+                WHERE id = ?
+                """,
+                (next_attempt_at, error, delivery_id),
+            )
+
+    def pending(self) -> Tuple[int, int, Optional[float]]:
+        """
+        Returns the number of pending notifications and deliveries, and when
+        the oldest of them was recorded.
+        """
+        db = self._db
+        notifications, oldest_notification = db.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM notification"
+        ).fetchone()
+        deliveries, oldest_delivery = db.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM delivery"
+        ).fetchone()
+        oldest = min(
+            (
+                created_at
+                for created_at in (oldest_notification, oldest_delivery)
+                if created_at is not None
+            ),
+            default=None,
+        )
+        return notifications, deliveries, oldest
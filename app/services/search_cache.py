@@ -0,0 +1,163 @@
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Set, Tuple, Union
+from uuid import UUID
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas.locations import LocationExpandedResponse
+from app.schemas.vaccine_availability import (
+    VaccineAvailabilityExpandedCreateResponse,
+    VaccineAvailabilityExpandedResponse,
+    VaccineAvailabilityTimeslotRequirementExpandedResponse,
+    VaccineLocationExpandedResponse,
+)
+
+# The nearby searches return every location within the vicinity of a postal
+# code, so a cached result is tagged with the FSA (first three characters of
+# a postal code) that was searched and with the FSA and id of every entity it
+# contains, which covers the neighbouring FSAs it spans. A write only evicts
+# the results carrying one of its tags, and a write that may add an entity
+# to a search (e.g. a new location or availability) evicts the results of
+# the entity's FSA. Each page of a search is cached on its own.
+vaccine_locations_cache: TTLCache[
+    Tuple[str, date, bool, int, Optional[int]],
+    List[VaccineLocationExpandedResponse],
+] = TTLCache(settings.SEARCH_CACHE_MAX_SIZE, settings.SEARCH_CACHE_TTL)
+
+vaccine_availability_cache: TTLCache[
+    Tuple[str, date, int, Optional[int]],
+    List[VaccineAvailabilityExpandedResponse],
+] = TTLCache(settings.SEARCH_CACHE_MAX_SIZE, settings.SEARCH_CACHE_TTL)
+
+# Encoded JSON of the locations, addresses and organizations in the search
+# results, keyed by kind, id and creation date, so that the entities that
+# rarely change aren't serialized again for every response. They are tagged
+# like the search results.
+entity_fragments: TTLCache[
+    Tuple[str, Union[UUID, int], datetime], bytes
+] = TTLCache(settings.FRAGMENT_CACHE_MAX_SIZE, settings.SEARCH_CACHE_TTL)
+
+# Fingerprint of the last availability reported per location (external key
+# or id), date, vaccine and authentication key, along with the availability
+# it created. They are tagged with the location and availability, so that
+# writes made otherwise evict them.
+availability_fingerprints: TTLCache[
+    Tuple[Union[str, int], datetime, Optional[int], UUID],
+    Tuple[bytes, VaccineAvailabilityExpandedCreateResponse],
+] = TTLCache(
+    settings.AVAILABILITY_FINGERPRINT_MAX_SIZE,
+    settings.AVAILABILITY_FINGERPRINT_TTL,
+)
+
+# FSAs of the locations that have been seen in a search result, so writes
+# that only know a location id don't need to look its postal code up. They
+# are tagged with the location, so that its writes evict them.
+location_fsas: TTLCache[int, str] = TTLCache(
+    settings.FRAGMENT_CACHE_MAX_SIZE, settings.SEARCH_CACHE_TTL
+)
+
+
+def fsa(postal_code: str) -> str:
+    return postal_code.replace(" ", "")[:3].upper()
+
+
+def fsa_tag(postal_code: str) -> str:
+    return f"fsa:{fsa(postal_code)}"
+
+
+def location_tag(location_id: Union[UUID, int]) -> str:
+    return f"location:{location_id}"
+
+
+def address_tag(address_id: Union[UUID, int]) -> str:
+    return f"address:{address_id}"
+
+
+def organization_tag(organization_id: Union[UUID, int]) -> str:
+    return f"organization:{organization_id}"
+
+
+def availability_tag(availability_id: Union[UUID, int]) -> str:
+    return f"availability:{availability_id}"
+
+
+def timeslot_tag(timeslot_id: Union[UUID, int]) -> str:
+    return f"timeslot:{timeslot_id}"
+
+
+def requirement_tag(requirement_id: Union[UUID, int]) -> str:
+    return f"requirement:{requirement_id}"
+
+
+def _location_tags(location: LocationExpandedResponse) -> Set[str]:
+    tags = {location_tag(location.id)}
+    postal_codes = [location.postcode]
+    if location.address is not None:
+        tags.add(address_tag(location.address.id))
+        postal_codes.append(location.address.postcode)
+    if location.organization is not None:
+        tags.add(organization_tag(location.organization.id))
+    for postal_code in postal_codes:
+        if postal_code:
+            tags.add(fsa_tag(postal_code))
+            location_fsas.set(
+                location.id,
+                fsa(postal_code),
+                tags=[location_tag(location.id)],
+            )
+    return tags
+
+
+def _availability_tags(
+    availability: Union[
+        VaccineAvailabilityExpandedResponse,
+        VaccineAvailabilityTimeslotRequirementExpandedResponse,
+    ]
+) -> Set[str]:
+    tags = {availability_tag(availability.id)}
+    tags.update(timeslot_tag(t.id) for t in availability.timeslots)
+    tags.update(requirement_tag(r.id) for r in availability.requirements)
+    return tags
+
+
+def vaccine_location_tags(
+    postal_code: str, locations: Iterable[VaccineLocationExpandedResponse]
+) -> Set[str]:
+    tags = {fsa_tag(postal_code)}
+    for location in locations:
+        tags.update(_location_tags(location))
+        for availability in location.vaccine_availabilities:
+            tags.update(_availability_tags(availability))
+    return tags
+
+
+def vaccine_availability_tags(
+    postal_code: str,
+    availabilities: Iterable[VaccineAvailabilityExpandedResponse],
+) -> Set[str]:
+    tags = {fsa_tag(postal_code)}
+    for availability in availabilities:
+        tags.update(_location_tags(availability.location))
+        tags.update(_availability_tags(availability))
+    return tags
+
+
+def invalidate(tags: Iterable[str], fingerprints: bool = True) -> int:
+    """
+    Evicts every cached search result, fragment and availability fingerprint
+    carrying one of `tags`. Returns the number of search results evicted.
+    :param fingerprints: Whether to evict the availability fingerprints too.
+    The reports of availabilities record their own fingerprints.
+    """
+    tag_list = list(tags)
+    evicted = vaccine_locations_cache.invalidate_tags(tag_list)
+    evicted += vaccine_availability_cache.invalidate_tags(tag_list)
+    entity_fragments.invalidate_tags(tag_list)
+    location_fsas.invalidate_tags(tag_list)
+    if fingerprints:
+        availability_fingerprints.invalidate_tags(tag_list)
+    return evicted
+
+
+def is_empty() -> bool:
+    return not vaccine_locations_cache and not vaccine_availability_cache
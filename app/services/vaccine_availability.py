@@ -1,17 +1,35 @@
+import hashlib
 from collections import defaultdict
-from datetime import date, timezone
+from datetime import date, datetime, timezone
 from pprint import PrettyPrinter
-from typing import Dict, List, Optional, Type
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
 from loguru import logger
 from pywebpush import webpush
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.core.write_behind import WriteBehindBuffer
+from app.db.database import db
+from app.db.rows import record_rows
 from app.schemas.addresses import AddressResponse
-from app.schemas.locations import LocationResponse
+from app.schemas.locations import LocationExpandedResponse, LocationResponse
 from app.schemas.organizations import OrganizationResponse
 from app.schemas.vaccine_availability import (
     VaccineAvailabilityCreateRequest,
+    VaccineAvailabilityExpandedBulkCreateRequest,
+    VaccineAvailabilityExpandedBulkCreateResponse,
     VaccineAvailabilityExpandedCreateRequest,
     VaccineAvailabilityExpandedCreateResponse,
     VaccineAvailabilityExpandedResponse,
@@ -20,20 +38,114 @@ from app.schemas.vaccine_availability import (
     VaccineAvailabilityTimeslotResponse,
     VaccineAvailabilityUpdateRequest,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 from app.services.discord import discordCallNoDoses, discordCallReport
 from app.services.exceptions import (
     DatabaseNotInSyncError,
     InternalDatabaseError,
+    InvalidAuthenticationKeyForRequest,
 )
 from app.services.locations import LocationService
+from app.services.push_delivery import push_deliveries
 from app.services.vaccine_availability_requirement import (
     VaccineAvailabilityRequirementService,
 )
 from app.services.vaccine_availability_timeslot import (
     VaccineAvailabilityTimeslotService,
 )
-from app.services.webPush import WebPushService
+
+availability_searches: SingleFlight[
+    Tuple[str, date, int, Optional[int]],
+    List[VaccineAvailabilityExpandedResponse],
+] = SingleFlight()
+
+
+class PendingReport(NamedTuple):
+    va_expanded: VaccineAvailabilityExpandedCreateRequest
+    locationID: Optional[int]
+    external_key: Optional[str]
+    auth_key: UUID
+
+
+# Response code of the reported availabilities that are the same as the last
+# ones reported, which weren't written to the database again.
+NOT_MODIFIED_RESPONSE_CODE = -2
+
+# Authentication keys refused while flushing buffered reports, e.g. because
+# they were revoked. Their reports aren't buffered until one is accepted
+# again, so that they are refused rather than answered with 202 Accepted.
+refused_auth_keys: TTLCache[UUID, bool] = TTLCache(
+    settings.AVAILABILITY_REFUSED_KEYS_MAX_SIZE,
+    settings.AVAILABILITY_REFUSED_KEYS_TTL,
+)
+
+
+def _fingerprint_key(
+    va_expanded: VaccineAvailabilityExpandedCreateRequest,
+    locationID: Optional[int],
+    external_key: Optional[str],
+    auth_key: UUID,
+) -> Optional[Tuple[Union[str, int], datetime, Optional[int], UUID]]:
+    location = external_key if external_key is not None else locationID
+    if location is None:
+        return None
+    # The authentication key is part of the key so that an unchanged report
+    # made with an invalid key still reaches the database and is rejected.
+    return location, va_expanded.date, va_expanded.vaccine, auth_key
+
+
+def _fingerprint(
+    va_expanded: VaccineAvailabilityExpandedCreateRequest,
+) -> bytes:
+    content = va_expanded.json(sort_keys=True).encode()
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def _last_reported(
+    key: Optional[Tuple[Union[str, int], datetime, Optional[int], UUID]]
+) -> Optional[Tuple[bytes, VaccineAvailabilityExpandedCreateResponse]]:
+    if key is None:
+        return None
+    return search_cache.availability_fingerprints.get(key)
+
+
+def _unchanged(
+    va_expanded: VaccineAvailabilityExpandedCreateRequest,
+    previous: Optional[
+        Tuple[bytes, VaccineAvailabilityExpandedCreateResponse]
+    ],
+) -> Optional[VaccineAvailabilityExpandedCreateResponse]:
+    """
+    Returns the availability created by the last report of the same location,
+    date and vaccine if it had the same content, with the not modified
+    response code. None if the report has to be written.
+    """
+    if previous is None or previous[0] != _fingerprint(va_expanded):
+        return None
+    return previous[1].copy(
+        update={"response_code": NOT_MODIFIED_RESPONSE_CODE}
+    )
+
+
+def _remember(
+    va_expanded: VaccineAvailabilityExpandedCreateRequest,
+    locationID: Optional[int],
+    external_key: Optional[str],
+    auth_key: UUID,
+    resp: VaccineAvailabilityExpandedCreateResponse,
+) -> None:
+    key = _fingerprint_key(va_expanded, locationID, external_key, auth_key)
+    if key is None:
+        return
+    search_cache.availability_fingerprints.set(
+        key,
+        (_fingerprint(va_expanded), resp),
+        tags=[
+            search_cache.location_tag(resp.location),
+            search_cache.availability_tag(resp.id),
+        ],
+    )
 
 
 class VaccineAvailabilityService(
@@ -50,6 +162,8 @@ class VaccineAvailabilityService(
     update_procedure_id_parameter = "id"
     delete_procedure_name = "vaccine_availability_Delete"
     delete_procedure_id_parameter = "avaliabilityID"
+    # The ids are UUIDs, selected by the create sproc
+    create_returns_id = False
 
     @property
     def table(self) -> str:
@@ -67,10 +181,55 @@ class VaccineAvailabilityService(
     def update_response_schema(self) -> Type[VaccineAvailabilityUpdateRequest]:
         return VaccineAvailabilityUpdateRequest
 
+    async def _invalidate_cached(
+        self,
+        identifier: Union[UUID, int],
+        db_obj: Optional[VaccineAvailabilityResponse],
+    ) -> None:
+        tags = [search_cache.availability_tag(identifier)]
+        if db_obj is not None:
+            tags.append(search_cache.location_tag(db_obj.location))
+            # The availability may have added its location to the searches
+            # of its FSA
+            location_fsa = await self._location_fsa(db_obj.location)
+            if location_fsa is not None:
+                tags.append(search_cache.fsa_tag(location_fsa))
+        search_cache.invalidate(tags)
+
+    async def _location_fsa(self, location_id: int) -> Optional[str]:
+        """
+        Returns the FSA of a location so that searches it may now appear in
+        can be evicted. The location is only read from the database when
+        something is cached and no recent search result contained it.
+        """
+        if search_cache.is_empty():
+            return None
+        location_fsa = search_cache.location_fsas.get(location_id)
+        if location_fsa is None:
+            location = await LocationService(self._db).get(location_id)
+            if location is None or not location.postcode:
+                return None
+            location_fsa = search_cache.fsa(location.postcode)
+        return location_fsa
+
     async def get_expanded(
         self, id: UUID
     ) -> Optional[VaccineAvailabilityExpandedResponse]:
-        vaccine_availability = await super().get(id)
+        # The timeslots and requirements only need the id, so they are read
+        # alongside the vaccine availability instead of after it.
+        (
+            vaccine_availability,
+            timeslots,
+            requirements,
+        ) = await self._db.gather(
+            lambda db: VaccineAvailabilityService(db).get(id),
+            lambda db: VaccineAvailabilityTimeslotService(
+                db
+            ).get_by_vaccine_availability_id(vaccine_availability_id=id),
+            lambda db: VaccineAvailabilityRequirementService(
+                db
+            ).get_by_vaccine_availability_id(vaccine_availability_id=id),
+        )
 
         if vaccine_availability is not None:
             location = await LocationService(self._db).get_expanded(
@@ -83,18 +242,6 @@ class VaccineAvailabilityService(
                 for vaccine_availability {vaccine_availability.id}
                 """
 
-            timeslots = await VaccineAvailabilityTimeslotService(
-                self._db
-            ).get_by_vaccine_availability_id(
-                vaccine_availability_id=vaccine_availability.id
-            )
-
-            requirements = await VaccineAvailabilityRequirementService(
-                self._db
-            ).get_by_vaccine_availability_id(
-                vaccine_availability_id=vaccine_availability.id
-            )
-
             vaccine_availability_expanded = vaccine_availability.dict()
             vaccine_availability_expanded.update(
                 {
@@ -104,8 +251,6 @@ class VaccineAvailabilityService(
                 }
             )
 
-            logger.critical(vaccine_availability_expanded)
-
             return VaccineAvailabilityExpandedResponse(
                 **vaccine_availability_expanded
             )
@@ -113,13 +258,61 @@ class VaccineAvailabilityService(
         return vaccine_availability
 
     async def get_filtered_multi_expanded(
-        self, postal_code: str, min_date: date
+        self,
+        postal_code: str,
+        min_date: date,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[VaccineAvailabilityExpandedResponse]:
+        """
+        Retrieves the vaccine availabilities within the vicinity of
+        `postal_code`, served from the search cache when possible.
+        :param offset: The number of availabilities skipped.
+        :param limit: The number of availabilities returned at most, all of
+        them by default.
+        """
+        key = (search_cache.fsa(postal_code), min_date, offset, limit)
+        availabilities = search_cache.vaccine_availability_cache.get(key)
+        if availabilities is not None:
+            return availabilities
+
+        async def load() -> List[VaccineAvailabilityExpandedResponse]:
+            # Not cached if a write invalidated it while it was loading
+            generation = search_cache.vaccine_availability_cache.generation
+            # Shared by the searches coalesced on it, so it queries over a
+            # connection of its own rather than the first caller's, which is
+            # released once that caller is done.
+            async with self._db.borrow() as connection:
+                loaded = await VaccineAvailabilityService(
+                    connection
+                )._fetch_filtered_multi_expanded(*key)
+            search_cache.vaccine_availability_cache.set(
+                key,
+                loaded,
+                tags=search_cache.vaccine_availability_tags(key[0], loaded),
+                generation=generation,
+            )
+            return loaded
+
+        # Identical searches arriving while one is in flight share its result
+        return await availability_searches.do(key, load)
+
+    async def _fetch_filtered_multi_expanded(
+        self,
+        postal_code: str,
+        min_date: date,
+        offset: int,
+        limit: Optional[int],
     ) -> List[VaccineAvailabilityExpandedResponse]:
         procedure_name = "GetAvailableVaccines"
 
         ret_val, sproc_processed = await self._db.sproc_fetch(
             procedure_name,
             parameters={"postal": postal_code, "date": min_date},
+            # The rows are only unpacked into models
+            row_factory=record_rows,
+            # The availabilities after the page aren't read
+            max_rows=None if limit is None else offset + limit,
         )
 
         availability_rows = sproc_processed[0]
@@ -142,10 +335,28 @@ class VaccineAvailabilityService(
         ):
             raise InternalDatabaseError()
 
+        # Only the rows of the availabilities of the page are built
+        availability_rows = availability_rows[offset:]
+        availability_ids = {row["id"] for row in availability_rows}
+        timeslot_rows = [
+            row
+            for row in timeslot_rows
+            if row["vaccine_availability"] in availability_ids
+        ]
+        requirement_rows = [
+            row
+            for row in requirement_rows
+            if row["vaccine_availability"] in availability_ids
+        ]
+
         # convert to hash tables
+        # The rows come from the database, so the models are built from them
+        # without being validated again.
+
         # timeslots should be hashable by vaccine_availability
         timeslot_rows_valid = [
-            VaccineAvailabilityTimeslotResponse(**t) for t in timeslot_rows
+            VaccineAvailabilityTimeslotResponse.from_row(t)
+            for t in timeslot_rows
         ]
         timeslot_hash: Dict[
             UUID, List[VaccineAvailabilityTimeslotResponse]
@@ -157,7 +368,7 @@ class VaccineAvailabilityService(
 
         # requirements should be hashable by vaccine_availability
         requirement_rows_valid = [
-            VaccineAvailabilityRequirementsResponse(**r)
+            VaccineAvailabilityRequirementsResponse.from_row(r)
             for r in requirement_rows
         ]
         requirement_hash: Dict[
@@ -168,17 +379,24 @@ class VaccineAvailabilityService(
                 requirement_row
             )
 
-        location_hash = {l["id"]: LocationResponse(**l) for l in location_rows}
-        address_hash = {a["id"]: AddressResponse(**a) for a in address_rows}
+        location_hash = {
+            l["id"]: LocationResponse.from_row(l) for l in location_rows
+        }
+        address_hash = {
+            a["id"]: AddressResponse.from_row(a) for a in address_rows
+        }
         organization_hash = {
-            o["id"]: OrganizationResponse(**o) for o in organization_rows
+            o["id"]: OrganizationResponse.from_row(o)
+            for o in organization_rows
         }
 
         # expand availabilities
         availabilities: List[VaccineAvailabilityExpandedResponse] = []
 
         for availability_row in availability_rows:
-            availability = VaccineAvailabilityResponse(**availability_row)
+            availability = VaccineAvailabilityResponse.from_row(
+                availability_row
+            )
 
             timeslots = timeslot_hash.get(availability.id, [])
             requirements = requirement_hash.get(availability.id, [])
@@ -204,26 +422,35 @@ class VaccineAvailabilityService(
                     f"organization `{location.organization}` does not exist"
                 )
 
-            location_dict = location.dict()
-            location_dict["address"] = address.dict()
-            location_dict["organization"] = organization.dict()
-            availability_dict = availability.dict()
-            availability_dict["timeslots"] = timeslots
-            availability_dict["requirements"] = requirements
-            availability_dict["location"] = location_dict
+            location_expanded = LocationExpandedResponse.from_row(
+                location.__dict__, address=address, organization=organization
+            )
             availabilities.append(
-                VaccineAvailabilityExpandedResponse(**availability_dict)
+                VaccineAvailabilityExpandedResponse.from_row(
+                    availability.__dict__,
+                    timeslots=timeslots,
+                    requirements=requirements,
+                    location=location_expanded,
+                )
             )
         return availabilities
 
     async def get_by_location(
-        self, locationID: int, min_date: date
+        self,
+        locationID: int,
+        min_date: date,
+        offset: int = 0,
+        limit: Optional[int] = None,
     ) -> List[VaccineAvailabilityResponse]:
         procedure_name = "vaccine_availability_ReadByLocation"
 
         ret_val, sproc_processed = await self._db.sproc_fetch(
             procedure_name,
             parameters={"locationID": locationID, "date": min_date},
+            # The rows are only unpacked into models
+            row_factory=record_rows,
+            # The availabilities after the page aren't read
+            max_rows=None if limit is None else offset + limit,
         )
 
         availability_rows = sproc_processed[0]
@@ -237,11 +464,9 @@ class VaccineAvailabilityService(
         # expand availabilities
         availabilities: List[VaccineAvailabilityResponse] = []
 
-        for availability_row in availability_rows:
-            availability = VaccineAvailabilityResponse(**availability_row)
-
+        for availability_row in availability_rows[offset:]:
             availabilities.append(
-                VaccineAvailabilityResponse(**availability.dict())
+                VaccineAvailabilityResponse.from_row(availability_row)
             )
         return availabilities
 
@@ -251,7 +476,217 @@ class VaccineAvailabilityService(
         locationID: Optional[int],
         external_key: Optional[str],
         auth_key: UUID,
+    ) -> Optional[VaccineAvailabilityExpandedCreateResponse]:
+        """
+        Creates the availability reported for a location. With
+        `AVAILABILITY_WRITE_BEHIND`, a report of a location, date and vaccine
+        already reported with the same authentication key is buffered
+        instead, unless the key was refused while flushing buffered reports
+        and hasn't been accepted since, and only the latest of the reports
+        buffered within
+        `AVAILABILITY_WRITE_BEHIND_WINDOW` seconds is created.
+        :return: The created availability. None if the report was buffered.
+        """
+        if (
+            availability_writes.is_running
+            and refused_auth_keys.get(auth_key) is None
+        ):
+            key = _fingerprint_key(
+                va_expanded, locationID, external_key, auth_key
+            )
+            # A report is only buffered once one of its key was accepted, so
+            # that invalid authentication keys are still rejected.
+            if key is not None and key in availability_writes:
+                availability_writes.put(
+                    key,
+                    PendingReport(
+                        va_expanded, locationID, external_key, auth_key
+                    ),
+                )
+                return None
+            previous = _last_reported(key)
+            if key is not None and previous is not None:
+                unchanged = _unchanged(va_expanded, previous)
+                if unchanged is not None:
+                    return unchanged
+                if availability_writes.put(
+                    key,
+                    PendingReport(
+                        va_expanded, locationID, external_key, auth_key
+                    ),
+                ):
+                    return None
+
+        return await self._write_expanded(
+            va_expanded, locationID, external_key, auth_key
+        )
+
+    async def _write_expanded(
+        self,
+        va_expanded: VaccineAvailabilityExpandedCreateRequest,
+        locationID: Optional[int],
+        external_key: Optional[str],
+        auth_key: UUID,
     ) -> VaccineAvailabilityExpandedCreateResponse:
+        resp = await self._create_expanded(
+            va_expanded, locationID, external_key, auth_key
+        )
+        refused_auth_keys.invalidate(auth_key)
+        if resp.response_code == NOT_MODIFIED_RESPONSE_CODE:
+            return resp
+
+        # The fingerprints of the other dates and vaccines of the location
+        # are still those last reported, so they are kept.
+        search_cache.invalidate(
+            [
+                search_cache.fsa_tag(va_expanded.postcode),
+                search_cache.location_tag(resp.location),
+                search_cache.availability_tag(resp.id),
+            ],
+            fingerprints=False,
+        )
+        _remember(va_expanded, locationID, external_key, auth_key, resp)
+
+        if resp.response_code > 0:
+            if va_expanded.numberAvailable > 0:
+                # Sent in the background, the reporter doesn't wait for it
+                await push_deliveries.enqueue(va_expanded.postcode, locationID)
+
+        # if ret_value > 0:
+        #    if va_expanded.numberAvailable > 0:
+        #        discordCallReport(va_expanded)
+        #    else:
+        #        discordCallNoDoses(va_expanded)
+
+        return resp
+
+    async def create_expanded_many(
+        self,
+        va_expanded: Sequence[VaccineAvailabilityExpandedBulkCreateRequest],
+        auth_key: UUID,
+    ) -> List[VaccineAvailabilityExpandedBulkCreateResponse]:
+        """
+        Creates the availabilities reported for locations identified by
+        their external keys, `BULK_INGEST_CHUNK_SIZE` at a time in one
+        transaction each, over the connection of the service. The ones that
+        are the same as the last ones reported aren't written again. The
+        subscribers of each area with available doses are notified once,
+        after every chunk was created.
+        :param va_expanded: The availabilities to create.
+        :param auth_key: An authentication key to create them.
+        :return: The outcome of each availability, in order.
+        """
+        # The reports buffered for the same availabilities are superseded.
+        for item in va_expanded:
+            key = _fingerprint_key(item, None, item.external_key, auth_key)
+            if key is not None:
+                availability_writes.discard(key)
+
+        created: List[Optional[VaccineAvailabilityExpandedCreateResponse]]
+        created = []
+        chunk_size = max(settings.BULK_INGEST_CHUNK_SIZE, 1)
+        try:
+            for start in range(0, len(va_expanded), chunk_size):
+                created.extend(
+                    await self._create_expanded_chunk(
+                        va_expanded[start : start + chunk_size], auth_key
+                    )
+                )
+        finally:
+            # The chunks committed before a failure are invalidated too.
+            written = [
+                (item, resp)
+                for item, resp in zip(va_expanded, created)
+                if resp is not None
+                and resp.response_code != NOT_MODIFIED_RESPONSE_CODE
+            ]
+            tags = set()
+            for item, resp in written:
+                tags.add(search_cache.fsa_tag(item.postcode))
+                tags.add(search_cache.location_tag(resp.location))
+                tags.add(search_cache.availability_tag(resp.id))
+            search_cache.invalidate(tags, fingerprints=False)
+            for item, resp in written:
+                _remember(item, None, item.external_key, auth_key, resp)
+
+        notified: Dict[str, Tuple[str, int]] = {}
+        for item, resp in written:
+            if resp.response_code > 0 and item.numberAvailable > 0:
+                notified.setdefault(
+                    search_cache.fsa(item.postcode),
+                    (item.postcode, resp.location),
+                )
+        for postcode, location in notified.values():
+            # Sent in the background, the reporter doesn't wait for it
+            await push_deliveries.enqueue(postcode, location)
+
+        return [
+            VaccineAvailabilityExpandedBulkCreateResponse(
+                external_key=item.external_key,
+                response_code=-1 if resp is None else resp.response_code,
+                availability=resp,
+            )
+            for item, resp in zip(va_expanded, created)
+        ]
+
+    async def _create_expanded_chunk(
+        self,
+        va_expanded: Sequence[VaccineAvailabilityExpandedBulkCreateRequest],
+        auth_key: UUID,
+    ) -> List[Optional[VaccineAvailabilityExpandedCreateResponse]]:
+        """
+        Creates a chunk of availabilities in one transaction. If one of them
+        fails, the transaction is rolled back and they are created one at a
+        time instead, so that only the ones that failed aren't created.
+        :return: The created availabilities, None for the ones that failed.
+        """
+        transaction = self._db.transaction()
+        await transaction.start(is_root=True, extra_options={})
+        try:
+            created = [
+                await self._create_expanded(
+                    item, None, item.external_key, auth_key
+                )
+                for item in va_expanded
+            ]
+        except InternalDatabaseError:
+            await transaction.rollback()
+        except BaseException:
+            await transaction.rollback()
+            raise
+        else:
+            await transaction.commit()
+            return list(created)
+
+        responses: List[Optional[VaccineAvailabilityExpandedCreateResponse]]
+        responses = []
+        for item in va_expanded:
+            try:
+                resp = await self._create_expanded(
+                    item, None, item.external_key, auth_key
+                )
+            except InternalDatabaseError:
+                logger.warning(
+                    "Failed to create availability of location {}",
+                    item.external_key,
+                )
+                responses.append(None)
+            else:
+                responses.append(resp)
+        return responses
+
+    async def _create_expanded(
+        self,
+        va_expanded: VaccineAvailabilityExpandedCreateRequest,
+        locationID: Optional[int],
+        external_key: Optional[str],
+        auth_key: UUID,
+    ) -> VaccineAvailabilityExpandedCreateResponse:
+        key = _fingerprint_key(va_expanded, locationID, external_key, auth_key)
+        unchanged = _unchanged(va_expanded, _last_reported(key))
+        if unchanged is not None:
+            return unchanged
+
         procedure_name = "vaccine_availability_expanded_Create"
 
         parameters = {
@@ -287,7 +722,9 @@ class VaccineAvailabilityService(
             procedure_name, parameters, auth_key=auth_key
         )
 
-        if ret_value < 0:
+        if ret_value == 0:
+            raise InvalidAuthenticationKeyForRequest()
+        elif ret_value < 0:
             raise InternalDatabaseError()
 
         availability_rows = sproc_processed[0]
@@ -295,23 +732,57 @@ class VaccineAvailabilityService(
         if availability_rows is None or availability_rows[0] is None:
             raise InternalDatabaseError()
 
-        availability_rows[0]["response_code"] = ret_value
-
-        resp = VaccineAvailabilityExpandedCreateResponse(
-            **availability_rows[0]
+        return VaccineAvailabilityExpandedCreateResponse(
+            **{**availability_rows[0], "response_code": ret_value}
         )
 
-        if ret_value > 0:
-            if va_expanded.numberAvailable > 0:
-                wpservice = WebPushService(self._db)
-                await WebPushService.SendWebpush(
-                    wpservice, va_expanded.postcode, locationID
+
+async def _flush_reports(reports: List[PendingReport]) -> None:
+    """
+    Creates the buffered reports of availabilities over one connection.
+    """
+    connection = db.connection
+    await connection.acquire(autocommit=True)
+    try:
+        service = VaccineAvailabilityService(connection)
+        for index, report in enumerate(reports):
+            if refused_auth_keys.get(report.auth_key) is not None:
+                continue
+            try:
+                await service._write_expanded(*report)
+            except InvalidAuthenticationKeyForRequest:
+                # The other reports of the key, buffered or left in the
+                # batch, are dropped too
+                refused_auth_keys.set(report.auth_key, True)
+                dropped = availability_writes.discard_if(
+                    lambda key: key[3] == report.auth_key
+                )
+                dropped += sum(
+                    1
+                    for other in reports[index:]
+                    if other.auth_key == report.auth_key
+                )
+                logger.warning(
+                    "Dropped {} buffered availability report(s) of a refused "
+                    "authentication key",
+                    dropped,
                 )
+            except InternalDatabaseError as e:
+                logger.warning(
+                    "Failed to create buffered availability of location {}: "
+                    "{!r}",
+                    report.external_key or report.locationID,
+                    e,
+                )
+    finally:
+        await connection.release()
 
-        # if ret_value > 0:
-        #    if va_expanded.numberAvailable > 0:
-        #        discordCallReport(va_expanded)
-        #    else:
-        #        discordCallNoDoses(va_expanded)
 
-        return resp
+availability_writes: WriteBehindBuffer[
+    Tuple[Union[str, int], datetime, Optional[int], UUID], PendingReport
+] = WriteBehindBuffer(
+    _flush_reports,
+    settings.AVAILABILITY_WRITE_BEHIND_WINDOW,
+    settings.AVAILABILITY_WRITE_BEHIND_BATCH_SIZE,
+    settings.AVAILABILITY_WRITE_BEHIND_MAX_PENDING,
+)
@@ -1,12 +1,14 @@
 from collections import defaultdict
 from datetime import date, timezone
 from pprint import PrettyPrinter
-from typing import Dict, List, Optional, Type
+from typing import Dict, List, Optional, Tuple, Type
 from uuid import UUID
 
 from loguru import logger
 from pydantic.types import NonNegativeInt
 
+from app.core.singleflight import SingleFlight
+from app.db.rows import record_rows
 from app.schemas.addresses import AddressResponse
 from app.schemas.locations import LocationResponse
 from app.schemas.organizations import OrganizationResponse
@@ -15,10 +17,12 @@ from app.schemas.vaccine_availability import (
     VaccineAvailabilityExpandedResponse,
     VaccineAvailabilityRequirementsResponse,
     VaccineAvailabilityResponse,
+    VaccineAvailabilityTimeslotRequirementExpandedResponse,
     VaccineAvailabilityTimeslotResponse,
     VaccineAvailabilityUpdateRequest,
     VaccineLocationExpandedResponse,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 from app.services.exceptions import (
     DatabaseNotInSyncError,
@@ -29,6 +33,11 @@ from app.services.vaccine_availability_timeslot import (
     VaccineAvailabilityTimeslotService,
 )
 
+nearby_searches: SingleFlight[
+    Tuple[str, date, bool, int, Optional[int]],
+    List[VaccineLocationExpandedResponse],
+] = SingleFlight()
+
 
 class VaccineLocationsService(
     BaseService[
@@ -97,7 +106,59 @@ class VaccineLocationsService(
     #     return vaccine_availability
 
     async def get_filtered_multi_expanded(
-        self, postal_code: str, min_date: date, include_empty: bool
+        self,
+        postal_code: str,
+        min_date: date,
+        include_empty: bool,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[VaccineLocationExpandedResponse]:
+        """
+        Retrieves the locations within the vicinity of `postal_code`, served
+        from the search cache when possible.
+        :param offset: The number of locations skipped.
+        :param limit: The number of locations returned at most, all of them
+        by default.
+        """
+        key = (
+            search_cache.fsa(postal_code),
+            min_date,
+            include_empty,
+            offset,
+            limit,
+        )
+        locations = search_cache.vaccine_locations_cache.get(key)
+        if locations is not None:
+            return locations
+
+        async def load() -> List[VaccineLocationExpandedResponse]:
+            # Not cached if a write invalidated it while it was loading
+            generation = search_cache.vaccine_locations_cache.generation
+            # Shared by the searches coalesced on it, so it queries over a
+            # connection of its own rather than the first caller's, which is
+            # released once that caller is done.
+            async with self._db.borrow() as connection:
+                loaded = await VaccineLocationsService(
+                    connection
+                )._fetch_filtered_multi_expanded(*key)
+            search_cache.vaccine_locations_cache.set(
+                key,
+                loaded,
+                tags=search_cache.vaccine_location_tags(key[0], loaded),
+                generation=generation,
+            )
+            return loaded
+
+        # Identical searches arriving while one is in flight share its result
+        return await nearby_searches.do(key, load)
+
+    async def _fetch_filtered_multi_expanded(
+        self,
+        postal_code: str,
+        min_date: date,
+        include_empty: bool,
+        offset: int,
+        limit: Optional[int],
     ) -> List[VaccineLocationExpandedResponse]:
         procedure_name = "GetVaccineLocationsNearby"
 
@@ -108,6 +169,10 @@ class VaccineLocationsService(
                 "date": min_date,
                 "includeEmpty": include_empty,
             },
+            # The rows are only unpacked into models
+            row_factory=record_rows,
+            # The locations after the page aren't read
+            max_rows=None if limit is None else offset + limit,
         )
 
         location_rows = sproc_processed[0]
@@ -130,14 +195,34 @@ class VaccineLocationsService(
         ):
             raise InternalDatabaseError()
 
+        # Only the rows of the locations of the page are built
+        location_rows = location_rows[offset:]
+        location_ids = {row["id"] for row in location_rows}
+        availability_rows = [
+            row for row in availability_rows if row["location"] in location_ids
+        ]
+        availability_ids = {row["id"] for row in availability_rows}
+        timeslot_rows = [
+            row
+            for row in timeslot_rows
+            if row["vaccine_availability"] in availability_ids
+        ]
+        requirement_rows = [
+            row
+            for row in requirement_rows
+            if row["vaccine_availability"] in availability_ids
+        ]
+
         # convert to hash tables
+        # The rows come from the database, so the models are built from them
+        # without being validated again.
 
         # availabilities should be hashable by location
         availability_hash: Dict[
             NonNegativeInt, List[VaccineAvailabilityResponse]
         ] = defaultdict(list)
         availability_rows_valid = [
-            VaccineAvailabilityResponse(**t) for t in availability_rows
+            VaccineAvailabilityResponse.from_row(t) for t in availability_rows
         ]
 
         for availability_row in availability_rows_valid:
@@ -147,7 +232,8 @@ class VaccineLocationsService(
 
         # timeslots should be hashable by vaccine_availability
         timeslot_rows_valid = [
-            VaccineAvailabilityTimeslotResponse(**t) for t in timeslot_rows
+            VaccineAvailabilityTimeslotResponse.from_row(t)
+            for t in timeslot_rows
         ]
         timeslot_hash: Dict[
             UUID, List[VaccineAvailabilityTimeslotResponse]
@@ -159,7 +245,7 @@ class VaccineLocationsService(
 
         # requirements should be hashable by vaccine_availability
         requirement_rows_valid = [
-            VaccineAvailabilityRequirementsResponse(**r)
+            VaccineAvailabilityRequirementsResponse.from_row(r)
             for r in requirement_rows
         ]
         requirement_hash: Dict[
@@ -170,15 +256,18 @@ class VaccineLocationsService(
                 requirement_row
             )
 
-        address_hash = {a["id"]: AddressResponse(**a) for a in address_rows}
+        address_hash = {
+            a["id"]: AddressResponse.from_row(a) for a in address_rows
+        }
         organization_hash = {
-            o["id"]: OrganizationResponse(**o) for o in organization_rows
+            o["id"]: OrganizationResponse.from_row(o)
+            for o in organization_rows
         }
 
         locations: List[VaccineLocationExpandedResponse] = []
         # expand locations
         for location_row in location_rows:
-            location = LocationResponse(**location_row)
+            location = LocationResponse.from_row(location_row)
 
             try:
                 address = address_hash[location.address]
@@ -194,22 +283,24 @@ class VaccineLocationsService(
                     f"organization `{location.organization}` does not exist"
                 )
 
-            location_dict = location.dict()
-            location_dict["address"] = address.dict()
-            location_dict["organization"] = organization.dict()
-
-            availabilities_list = []
-            availabilities = availability_hash.get(location.id, [])
-            for availability in availabilities:
-                timeslots = timeslot_hash.get(availability.id, [])
-                requirements = requirement_hash.get(availability.id, [])
-
-                availability_dict = availability.dict()
-                availability_dict["timeslots"] = timeslots
-                availability_dict["requirements"] = requirements
-                availabilities_list.append(availability_dict)
-
-            location_dict["vaccineAvailabilities"] = availabilities_list
-
-            locations.append(VaccineLocationExpandedResponse(**location_dict))
+            availability_schema = (
+                VaccineAvailabilityTimeslotRequirementExpandedResponse
+            )
+            availabilities_list = [
+                availability_schema.from_row(
+                    availability.__dict__,
+                    timeslots=timeslot_hash.get(availability.id, []),
+                    requirements=requirement_hash.get(availability.id, []),
+                )
+                for availability in availability_hash.get(location.id, [])
+            ]
+
+            locations.append(
+                VaccineLocationExpandedResponse.from_row(
+                    location.__dict__,
+                    address=address,
+                    organization=organization,
+                    vaccine_availabilities=availabilities_list,
+                )
+            )
         return locations
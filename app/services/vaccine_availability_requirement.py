@@ -10,6 +10,7 @@ from app.schemas.vaccine_availability import (
     VaccineAvailabilityRequirementsResponse,
     VaccineAvailabilityRequirementUpdateRequest,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 from app.services.exceptions import (
     InternalDatabaseError,
@@ -31,6 +32,8 @@ class VaccineAvailabilityRequirementService(
     update_procedure_id_parameter = "id"
     delete_procedure_name = "vaccine_availability_requirements_Delete"
     delete_procedure_id_parameter = "id"
+    # The ids are UUIDs, selected by the create sproc
+    create_returns_id = False
 
     @property
     def table(self) -> str:
@@ -54,8 +57,20 @@ class VaccineAvailabilityRequirementService(
     ) -> Type[VaccineAvailabilityRequirementUpdateRequest]:
         return VaccineAvailabilityRequirementUpdateRequest
 
-    async def get_multi(
+    async def _invalidate_cached(
         self,
+        identifier: Union[UUID, int],
+        db_obj: Optional[VaccineAvailabilityRequirementsResponse],
+    ) -> None:
+        tags = [search_cache.requirement_tag(identifier)]
+        if db_obj is not None:
+            tags.append(
+                search_cache.availability_tag(db_obj.vaccine_availability)
+            )
+        search_cache.invalidate(tags)
+
+    async def get_multi(
+        self, limit: Optional[int] = None, after: Optional[int] = None
     ) -> List[VaccineAvailabilityRequirementsResponse]:
         raise NotImplementedError("Get multi is not available for timeslots")
 
@@ -1,14 +1,16 @@
-from typing import List, Optional, Type, Union
+from typing import List, Optional, Sequence, Type, Union
 from uuid import UUID
 
 from loguru import logger
 
+from app.core.config import settings
 from app.schemas.vaccine_availability import (
     VaccineAvailabilityTimeslotCreateRequest,
     VaccineAvailabilityTimeslotCreateSprocParams,
     VaccineAvailabilityTimeslotResponse,
     VaccineAvailabilityTimeslotUpdateRequest,
 )
+from app.services import search_cache
 from app.services.base import BaseService
 from app.services.exceptions import (
     InternalDatabaseError,
@@ -30,6 +32,8 @@ class VaccineAvailabilityTimeslotService(
     update_procedure_id_parameter = "id"
     delete_procedure_name = "vaccine_availability_timeslots_Delete"
     delete_procedure_id_parameter = "id"
+    # The ids are UUIDs, selected by the create sproc
+    create_returns_id = False
 
     @property
     def table(self) -> str:
@@ -51,8 +55,85 @@ class VaccineAvailabilityTimeslotService(
     ) -> Type[VaccineAvailabilityTimeslotUpdateRequest]:
         return VaccineAvailabilityTimeslotUpdateRequest
 
-    async def get_multi(
+    async def _invalidate_cached(
+        self,
+        identifier: Union[UUID, int],
+        db_obj: Optional[VaccineAvailabilityTimeslotResponse],
+    ) -> None:
+        tags = [search_cache.timeslot_tag(identifier)]
+        if db_obj is not None:
+            tags.append(
+                search_cache.availability_tag(db_obj.vaccine_availability)
+            )
+        search_cache.invalidate(tags)
+
+    async def create_many(
         self,
+        vaccine_availability_id: UUID,
+        timeslots: Sequence[VaccineAvailabilityTimeslotCreateRequest],
+        auth_key: UUID,
+    ) -> List[VaccineAvailabilityTimeslotResponse]:
+        """
+        Creates timeslots of a vaccine availability, `TIMESLOT_BATCH_SIZE`
+        per round trip, then reads them back by the vaccine availability in
+        one more. They are created in one transaction, so either every
+        timeslot is created or none is.
+        """
+        procedure_name = (
+            f"{self.table}_Create"
+            if self.create_procedure_name is None
+            else self.create_procedure_name
+        )
+        parameter_sets = [
+            VaccineAvailabilityTimeslotCreateSprocParams(
+                parentID=vaccine_availability_id, time=timeslot.time
+            ).dict()
+            for timeslot in timeslots
+        ]
+        batch_size = max(settings.TIMESLOT_BATCH_SIZE, 1)
+
+        # The ids are selected by the create sproc, not returned by it.
+        created_ids: List[UUID] = []
+        transaction = self._db.transaction()
+        await transaction.start(is_root=True, extra_options={})
+        try:
+            for start in range(0, len(parameter_sets), batch_size):
+                results = await self._db.execute_sproc_select_many(
+                    procedure_name,
+                    parameter_sets[start : start + batch_size],
+                    auth_key=auth_key,
+                )
+                for _, created_id in results:
+                    # Checked like the value `execute_sproc` returns
+                    self._check_write_return_value(procedure_name, created_id)
+                    created_ids.append(UUID(str(created_id)))
+            timeslots_by_id = {
+                timeslot.id: timeslot
+                for timeslot in await self.get_by_vaccine_availability_id(
+                    vaccine_availability_id, auth_key=auth_key
+                )
+                or []
+            }
+            if not all(
+                created_id in timeslots_by_id for created_id in created_ids
+            ):
+                raise InternalDatabaseError()
+        except BaseException:
+            await transaction.rollback()
+            raise
+        await transaction.commit()
+        created = [timeslots_by_id[created_id] for created_id in created_ids]
+
+        search_cache.invalidate(
+            [
+                search_cache.availability_tag(vaccine_availability_id),
+                *(search_cache.timeslot_tag(t.id) for t in created),
+            ]
+        )
+        return created
+
+    async def get_multi(
+        self, limit: Optional[int] = None, after: Optional[int] = None
     ) -> List[VaccineAvailabilityTimeslotResponse]:
         raise NotImplementedError("Get multi is not available for timeslots")
 
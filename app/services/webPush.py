@@ -1,12 +1,25 @@
+import os
+import time
 from json import dumps
-from typing import List, Optional, Type
-from uuid import UUID
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+from urllib.parse import urlparse
 
-from pywebpush import WebPusher, WebPushException, webpush
+import aiohttp
+from loguru import logger
+from py_vapid import Vapid
+from pywebpush import WebPusher
 
 from app.core.config import settings
 from app.schemas.webPush import (
-    KeyResponse,
     SubscriptionBase,
     SubscriptionCreateRequest,
     SubscriptionResponse,
@@ -68,6 +81,20 @@ class WebPushService(
 
         return 0
 
+    async def DeleteWebhooks(self, endpoints: Sequence[str]) -> int:
+        """
+        Deletes the subscriptions of `endpoints` in a single batch.
+        :return: The number of subscriptions deleted.
+        """
+        procedure_name = "subscription_Delete"
+
+        ret_vals = await self._db.execute_sproc_many(
+            procedure_name,
+            [{"endpoint": endpoint} for endpoint in endpoints],
+        )
+
+        return sum(1 for ret_val in ret_vals if ret_val == 1)
+
     async def ReadByPostal(self, postal: str) -> List[SubscriptionResponse]:
         procedure_name = "subscription_ReadByPostal"
 
@@ -89,43 +116,159 @@ class WebPushService(
 
         return [SubscriptionResponse(**o) for o in subscription_rows]
 
-    async def SendWebpush(self, postal: str, location: Optional[int]) -> int:
-
-        subscriptions = await self.ReadByPostal(postal)
-
-        if len(subscriptions) > 0:
-            for subscription in subscriptions:
-                try:
-                    payload = {
-                        "title": "New appointment added on FYI",
-                        "body": "Use the search tool to book",
-                        "url": "https://appointments.vaccinehunters.ca/search/"
-                        + subscription.postalCode.replace(" ", ""),
-                    }
-
-                    webpush(
-                        subscription_info={
-                            "endpoint": subscription.endpoint,
-                            "keys": {
-                                "p256dh": subscription.p256dh,
-                                "auth": subscription.auth,
-                            },
-                        },
-                        data=dumps(payload),
-                        vapid_private_key=settings.VAPID_Private_Key,
-                        vapid_claims={
-                            "sub": "mailto:fyi@vaccinehunters.ca",
-                        },
-                    )
-                except WebPushException as ex:
-                    if ex.response and ex.response.json():
-                        extra = ex.response.json()
-                        # Do actual logging...
-                        print(
-                            "Remote service replied with a {}:{}, {}",
-                            extra.code,
-                            extra.errno,
-                            extra.message,
-                        )
-
-        return 1
+
+# Encryption of the notifications, per RFC 8188.
+CONTENT_ENCODING = "aes128gcm"
+
+# Statuses of push services for subscriptions that expired or were
+# unsubscribed, which won't accept notifications again.
+GONE_STATUS_CODES = frozenset((404, 410))
+
+
+class PushServiceError(Exception):
+    """
+    Raised when a push service doesn't accept a notification.
+    """
+
+    def __init__(self, status_code: int, reason: str) -> None:
+        super().__init__(f"Push failed: {status_code} {reason}")
+        self.status_code = status_code
+        self.reason = reason
+
+
+def is_subscription_gone(error: Exception) -> bool:
+    """
+    Returns whether sending a notification failed because its subscription
+    no longer exists, rather than a failure worth retrying.
+    """
+    return (
+        isinstance(error, PushServiceError)
+        and error.status_code in GONE_STATUS_CODES
+    )
+
+
+class VapidHeaders:
+    """
+    Signs the VAPID headers authenticating the notifications sent to a push
+    service, keyed by the origin of the push service (the audience of the
+    token). A signed token is reused until shortly before it expires rather
+    than signed again for every notification. Only used on the event loop,
+    where the notifications are posted with aiohttp, so it needs no lock; a
+    token is signed synchronously, once per push service and lifetime.
+    """
+
+    # Lifetime in seconds of a signed token, at most 24 hours per RFC 8292.
+    TOKEN_LIFETIME = 12 * 60 * 60
+    # Seconds before its expiry at which a token is signed again, so that it
+    # doesn't expire while a notification is on its way.
+    TOKEN_RENEWAL = 10 * 60
+
+    def __init__(self, private_key: str, subject: str) -> None:
+        self._private_key = private_key
+        self._subject = subject
+        self._vapid: Optional[Vapid] = None
+        self._headers: Dict[str, Tuple[float, Dict[str, str]]] = {}
+
+    def for_endpoint(self, endpoint: str) -> Dict[str, str]:
+        url = urlparse(endpoint)
+        audience = f"{url.scheme}://{url.netloc}"
+        now = time.time()
+        cached = self._headers.get(audience)
+        if cached is not None and now < cached[0] - self.TOKEN_RENEWAL:
+            return cached[1]
+        expires_at = int(now) + self.TOKEN_LIFETIME
+        headers: Dict[str, str] = self._signer().sign(
+            {"sub": self._subject, "aud": audience, "exp": expires_at}
+        )
+        self._headers[audience] = (expires_at, headers)
+        return headers
+
+    def _signer(self) -> Vapid:
+        if self._vapid is None:
+            if os.path.isfile(self._private_key):
+                self._vapid = Vapid.from_file(
+                    private_key_file=self._private_key
+                )
+            else:
+                self._vapid = Vapid.from_string(private_key=self._private_key)
+        return self._vapid
+
+
+vapid_headers = VapidHeaders(
+    settings.VAPID_Private_Key, "mailto:fyi@vaccinehunters.ca"
+)
+
+
+class EncryptedNotification(NamedTuple):
+    endpoint: str
+    body: bytes
+    headers: Dict[str, str]
+
+
+def encrypt_notification(
+    subscription: SubscriptionBase,
+) -> EncryptedNotification:
+    """
+    Encrypts the push notification about new appointments for a
+    subscription with its keys.
+    """
+    payload = {
+        "title": "New appointment added on FYI",
+        "body": "Use the search tool to book",
+        "url": "https://appointments.vaccinehunters.ca/search/"
+        + subscription.postalCode.replace(" ", ""),
+    }
+    encoded = WebPusher(
+        {
+            "endpoint": subscription.endpoint,
+            "keys": {"p256dh": subscription.p256dh, "auth": subscription.auth},
+        }
+    ).encode(dumps(payload), CONTENT_ENCODING)
+    return EncryptedNotification(
+        endpoint=subscription.endpoint,
+        body=encoded["body"],
+        headers={"content-encoding": CONTENT_ENCODING, "ttl": "0"},
+    )
+
+
+def encrypt_notifications(
+    subscriptions: Sequence[SubscriptionBase],
+) -> List[Union[EncryptedNotification, Exception]]:
+    """
+    Encrypts the notifications of a batch of subscriptions, so that a single
+    task of an executor encrypts many of them. The failure to encrypt the
+    notification of a subscription is returned in its place.
+    """
+    encrypted: List[Union[EncryptedNotification, Exception]] = []
+    for subscription in subscriptions:
+        try:
+            encrypted.append(encrypt_notification(subscription))
+        except Exception as e:
+            encrypted.append(e)
+    return encrypted
+
+
+async def post_notification(
+    notification: EncryptedNotification, session: aiohttp.ClientSession
+) -> None:
+    """
+    Posts an encrypted push notification to its push service, authenticated
+    with VAPID.
+    :param notification: The encrypted notification.
+    :param session: The session whose connections to the push service are
+    reused.
+    """
+    headers = {
+        **notification.headers,
+        **vapid_headers.for_endpoint(notification.endpoint),
+    }
+    async with session.post(
+        notification.endpoint, data=notification.body, headers=headers
+    ) as response:
+        if response.status > 202:
+            logger.warning(
+                "Push service replied with {}: {}",
+                response.status,
+                await response.text(),
+            )
+            raise PushServiceError(response.status, response.reason or "")